@@ -8,6 +8,7 @@ import cv2
 import base64
 from datetime import datetime
 from pathlib import Path
+from robot.jpeg_codec import decode_jpeg, encode_jpeg
 
 
 class VisionAnalyzer:
@@ -16,10 +17,13 @@ class VisionAnalyzer:
     Умная логика: YOLO детекции → фиксированные шаблоны, нет детекций → OpenAI Vision
     """
 
-    def __init__(self, config, camera=None, ai_detector=None):
+    def __init__(self, config, camera=None, ai_detector=None, ai_runtime=None):
         self.config = config
         self.camera = camera
         self.ai_detector = ai_detector
+        self.ai_runtime = ai_runtime
+        # последний кадр capture_frame() и JPEG, из которого он декодирован
+        self._captured = (None, None)
 
         # OpenAI API для случаев когда YOLO ничего не видит
         self.api_key = os.getenv('OPENAI_API_KEY')
@@ -38,8 +42,9 @@ class VisionAnalyzer:
         # Шаблоны для генерации описаний на основе YOLO
         self._init_description_templates()
 
-        # Проверяем доступность компонентов
-        if not self.ai_detector:
+        # Проверяем доступность компонентов; is None — детектор может быть
+        # ленивым, проверка на истинность загрузила бы модель при старте
+        if self.ai_detector is None:
             logging.warning(
                 "⚠️ SimpleAIDetector не подключен - детекция объектов недоступна")
         else:
@@ -164,13 +169,10 @@ class VisionAnalyzer:
             jpeg_data = self.camera.get_frame_jpeg()
             if jpeg_data is not None:
                 # Декодируем JPEG в numpy array
-                import cv2
-                import numpy as np
-
-                nparr = np.frombuffer(jpeg_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                frame = decode_jpeg(jpeg_data)
 
                 if frame is not None:
+                    self._captured = (frame, jpeg_data)
                     logging.debug("📷 Кадр получен и декодирован с камеры")
                     return frame
                 else:
@@ -190,7 +192,19 @@ class VisionAnalyzer:
             return []
 
         try:
-            detections = self.ai_detector.detect_objects(frame)
+            # Рантайм уже гоняет YOLO в фоне: если он обработал тот же JPEG
+            # камеры, из которого получен этот кадр, берём его детекции
+            # вместо повторного инференса. is_loaded — не запускать рантайм
+            detections = None
+            runtime = self.ai_runtime
+            captured_frame, captured_jpeg = self._captured
+            if (runtime is not None and getattr(runtime, "is_loaded", True)
+                    and frame is captured_frame):
+                result = runtime.last_result
+                if result is not None and result[0] is captured_jpeg:
+                    detections = result[1] or []
+            if detections is None:
+                detections = self.ai_detector.detect_objects(frame)
 
             # Адаптируем формат
             detected_objects = []
@@ -385,10 +399,9 @@ class VisionAnalyzer:
                 frame = cv2.resize(frame, (new_width, new_height))
 
             # Конвертируем в JPEG
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 80]
-            success, buffer = cv2.imencode('.jpg', frame, encode_param)
+            buffer = encode_jpeg(frame, 80)
 
-            if not success:
+            if buffer is None:
                 return None
 
             # В base64
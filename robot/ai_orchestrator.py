@@ -17,17 +17,19 @@ class AIOrchestrater:
     Координирует работу всех AI агентов и принимает решения
     """
 
-    def __init__(self, camera=None, robot_controller=None, ai_detector=None):
+    def __init__(self, camera=None, robot_controller=None, ai_detector=None, ai_runtime=None):
         """
         Инициализация AI оркестратора
         :param camera: существующий объект камеры
         :param robot_controller: существующий контроллер робота
         :param ai_detector: существующий SimpleAIDetector
+        :param ai_runtime: фоновый AIVisionRuntime (готовые детекции)
         """
         self.config = self._load_config()
         self.camera = camera
         self.robot = robot_controller
         self.ai_detector = ai_detector
+        self.ai_runtime = ai_runtime
 
         # Инициализируем агентов
         self.speech = None
@@ -147,7 +149,8 @@ class AIOrchestrater:
                 self.vision = VisionAnalyzer(
                     config=self.config.get('vision', {}),
                     camera=self.camera,
-                    ai_detector=self.ai_detector
+                    ai_detector=self.ai_detector,
+                    ai_runtime=self.ai_runtime
                 )
                 logging.info(
                     "✅ VisionAnalyzer с умной логикой инициализирован")
@@ -2,8 +2,7 @@
 import time
 import threading
 import base64
-import numpy as np
-import cv2
+from robot.jpeg_codec import decode_jpeg
 
 
 class AIVisionRuntime:
@@ -18,6 +17,9 @@ class AIVisionRuntime:
         self._thr = threading.Thread(target=self._loop, daemon=True)
         self._thr.start()
         self.last_frame_bgr = None
+        # (JPEG камеры, детекции по нему) — одним присваиванием, чтобы
+        # детекции можно было сверить с кадром, на котором они получены
+        self.last_result = None
 
     def stop(self):
         self._stop = True
@@ -31,8 +33,7 @@ class AIVisionRuntime:
                 if not jpeg:
                     time.sleep(0.05)
                     continue
-                frame = cv2.imdecode(np.frombuffer(
-                    jpeg, np.uint8), cv2.IMREAD_COLOR)
+                frame = decode_jpeg(jpeg)
                 self.last_frame_bgr = frame
                 if frame is None:
                     time.sleep(0.01)
@@ -40,6 +41,7 @@ class AIVisionRuntime:
 
                 dets = self.detector.detect_objects(frame)
                 self.last_detections = dets
+                self.last_result = (jpeg, dets)
                 self.last_ts = time.time()
                 now = self.last_ts
                 dt = now - prev
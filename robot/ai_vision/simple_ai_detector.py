@@ -41,23 +41,28 @@ class SimpleAIDetector:
                 frame, conf=self.confidence_threshold, verbose=False)
 
             detections = []
+            names = self.model.names
+            now = time.time()
             for result in results:
                 boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        confidence = float(box.conf[0])
-                        class_id = int(box.cls[0])
-                        class_name = self.model.names[class_id]
-
-                        detection = {
-                            'class_name': class_name,
-                            'confidence': confidence,
-                            'bbox': (int(x1), int(y1), int(x2-x1), int(y2-y1)),
-                            'center': (int((x1+x2)/2), int((y1+y2)/2)),
-                            'timestamp': time.time()
-                        }
-                        detections.append(detection)
+                if boxes is None or len(boxes) == 0:
+                    continue
+
+                # Тензоры всех боксов переносим в Python одним вызовом,
+                # а не по элементу на бокс; дальше только float/int
+                xyxy = boxes.xyxy.cpu().numpy().tolist()
+                confidences = boxes.conf.cpu().numpy().tolist()
+                class_ids = boxes.cls.cpu().numpy().astype(int).tolist()
+
+                for (x1, y1, x2, y2), confidence, class_id in zip(xyxy, confidences, class_ids):
+                    detection = {
+                        'class_name': names[class_id],
+                        'confidence': confidence,
+                        'bbox': (int(x1), int(y1), int(x2-x1), int(y2-y1)),
+                        'center': (int((x1+x2)/2), int((y1+y2)/2)),
+                        'timestamp': now
+                    }
+                    detections.append(detection)
 
             return detections
 
@@ -67,17 +72,26 @@ class SimpleAIDetector:
 
     def draw_detections(self, frame: np.ndarray, detections: List[Dict]) -> np.ndarray:
         """Отрисовка детекций на кадре"""
+        self.draw_detections_inplace(frame, detections)
+        return frame
+
+    def draw_detections_inplace(self, frame: np.ndarray, detections: List[Dict]) -> None:
+        """Отрисовка детекций прямо в переданный буфер (без копии кадра)"""
+        fh, fw = frame.shape[:2]
         for det in detections:
             x, y, w, h = det['bbox']
             confidence = det['confidence']
             class_name = det['class_name']
 
-            # Рамка
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            # Рамка, обрезанная по границам кадра; на 0–10 рамок скалярная
+            # обрезка дешевле numpy-массивов
+            x1 = min(max(x, 0), fw - 1)
+            y1 = min(max(y, 0), fh - 1)
+            x2 = min(max(x + w, 0), fw - 1)
+            y2 = min(max(y + h, 0), fh - 1)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
 
             # Подпись
             label = f"{class_name}: {confidence:.2f}"
             cv2.putText(frame, label, (x, y - 10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-        return frame
@@ -16,7 +16,7 @@ except ImportError as e:
     AIOrchestrater = None
 
 
-def create_ai_blueprint(robot_controller=None, camera=None, ai_detector=None):
+def create_ai_blueprint(robot_controller=None, camera=None, ai_detector=None, ai_runtime=None):
     """
     Создание Blueprint для AI функций робота
 
@@ -24,6 +24,7 @@ def create_ai_blueprint(robot_controller=None, camera=None, ai_detector=None):
         robot_controller: Контроллер робота
         camera: Объект камеры 
         ai_detector: SimpleAIDetector для YOLO
+        ai_runtime: AIVisionRuntime с последними детекциями
 
     Returns:
         Blueprint: Flask blueprint с AI endpoints
@@ -37,7 +38,8 @@ def create_ai_blueprint(robot_controller=None, camera=None, ai_detector=None):
             ai_orchestrator = AIOrchestrater(
                 camera=camera,
                 robot_controller=robot_controller,
-                ai_detector=ai_detector
+                ai_detector=ai_detector,
+                ai_runtime=ai_runtime
             )
             logging.info("🧠 AI Оркестратор инициализирован для API")
         except Exception as e:
@@ -3,76 +3,230 @@
 Простое API для YOLO 8 детекции
 """
 
-from flask import Blueprint, jsonify, Response
+from flask import Blueprint, Response
 import base64
 import cv2
 import time
 import logging
+import threading
 import numpy as np
 from flask import request
+from robot.api.mjpeg import FrameBroadcast, mjpeg_part
+from robot.jpeg_codec import encode_jpeg
 logger = logging.getLogger(__name__)
 
+# Как часто продюсер AI-стрима проверяет рантайм (верхняя граница fps=30)
+_RENDER_INTERVAL = 1.0 / 30
+# /ai/annotated_frame: качество, сколько держать продюсер после запроса
+# и сколько ждать первый кадр
+_ANNOTATED_QUALITY = 80
+_ANNOTATED_LEASE = 5.0
+_ANNOTATED_FIRST_WAIT = 0.5
+
+# orjson кодирует в C и понимает numpy; без него — обычный json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
+
+def _json_response(payload, status: int = 200) -> Response:
+    """JSON-ответ без jsonify: orjson, если установлен"""
+    if ORJSON_AVAILABLE:
+        body = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        body = json.dumps(payload)
+    return Response(body, status=status, mimetype="application/json")
+
+
+# Параметры /ai/stream: (имя, по умолчанию, минимум, максимум, тип)
+_STREAM_PARAMS = (
+    ("fps", 12.0, 1.0, 30.0, float),
+    ("scale", 0.75, 0.3, 1.0, float),  # 0.5..1.0 обычно достаточно
+    ("quality", 70, 40, 90, int),
+)
+
+
+def _parse_stream_params(args) -> list:
+    """Читает fps/scale/quality из query за один проход, с клампом"""
+    out = []
+    for name, default, lo, hi, cast in _STREAM_PARAMS:
+        value = args.get(name)
+        if value is None:
+            value = default
+        else:
+            try:
+                value = cast(value)
+            except ValueError:
+                value = default
+            if value != value:  # nan
+                value = default
+        out.append(lo if value < lo else hi if value > hi else value)
+    return out
+
+
+def _scale_detections(detections, sx: float, sy: float):
+    """Пересчёт bbox детекций под уменьшенный кадр"""
+    return [{**det, 'bbox': (int(det['bbox'][0] * sx), int(det['bbox'][1] * sy),
+                             int(det['bbox'][2] * sx), int(det['bbox'][3] * sy))}
+            for det in detections]
+
+
+class _AnnotatedRenderer:
+    """
+    Рисует детекции рантайма на уменьшенном кадре и кодирует JPEG.
+    Возвращает (jpeg, detections) или None, если ни кадр, ни детекции не изменились.
+    """
+
+    def __init__(self, ai_detector, ai_runtime, scale: float, quality: int):
+        self.ai_detector = ai_detector
+        self.ai_runtime = ai_runtime
+        self.scale = scale
+        self.quality = quality
+        self._last_key = None
+        self._scratch = None  # свой буфер под отрисовку
+        self._src_size = self._dst_size = None
+        self._sx = self._sy = 1.0
+
+    def __call__(self):
+        # Берём последний кадр из рантайма
+        frame = self.ai_runtime.last_frame_bgr
+        raw_detections = self.ai_runtime.last_detections
+        if frame is None:
+            return None
+
+        # Определяем — обновился ли буфер или набор детекций
+        key = (self.ai_runtime.last_ts, id(raw_detections))
+        if key == self._last_key:
+            return None
+        detections = raw_detections or []
+
+        # Размеры считаем один раз на разрешение кадра
+        h, w = frame.shape[:2]
+        if (w, h) != self._src_size:
+            self._src_size = (w, h)
+            self._dst_size = (max(1, int(w * self.scale)),
+                              max(1, int(h * self.scale)))
+            self._sx = self._dst_size[0] / w
+            self._sy = self._dst_size[1] / h
+            self._scratch = np.empty(
+                (self._dst_size[1], self._dst_size[0]) + frame.shape[2:], frame.dtype)
+
+        # Сначала даунскейл в scratch, потом рисуем на
+        # маленьком кадре; кадр рантайма не трогаем
+        scratch = self._scratch
+        if self._dst_size == self._src_size:
+            np.copyto(scratch, frame)
+            scaled = detections
+        else:
+            cv2.resize(frame, self._dst_size, dst=scratch,
+                       interpolation=cv2.INTER_LINEAR)
+            scaled = _scale_detections(detections, self._sx, self._sy)
+
+        self.ai_detector.draw_detections_inplace(scratch, scaled)
+
+        # Кодируем JPEG
+        jpeg = encode_jpeg(scratch, self.quality)
+        if jpeg is None:
+            return None
+
+        self._last_key = key
+        # детекции публикуем вместе с кадром, чтобы они ему соответствовали
+        return jpeg, detections
+
 
 def add_ai_detector_routes(bp: Blueprint, *, ai_detector, camera, ai_runtime, ok, err):
+    # base64 последнего аннотированного кадра: (seq продюсера, base64)
+    annotated_cache = {"entry": None}
+
+    # Один энкодер на все подключения с одинаковыми scale/quality
+    broadcasts = {}
+    broadcasts_lock = threading.Lock()
+
+    def get_broadcast(scale: float, quality: int) -> FrameBroadcast:
+        with broadcasts_lock:
+            broadcast = broadcasts.get((scale, quality))
+            if broadcast is None:
+                # простаивающие энкодеры других параметров больше не нужны
+                for k in [k for k, b in broadcasts.items() if not b.active]:
+                    del broadcasts[k]
+                broadcast = FrameBroadcast(
+                    _AnnotatedRenderer(ai_detector, ai_runtime, scale, quality),
+                    _RENDER_INTERVAL, name=f"ai-stream-{scale}-{quality}")
+                broadcasts[(scale, quality)] = broadcast
+            return broadcast
+
     @bp.route("/ai/annotated_frame", methods=["GET"])
     def ai_annotated_frame():
         """Получить кадр с аннотациями AI"""
         try:
             if not camera:
-                return jsonify({
+                return _json_response({
                     "success": False,
                     "error": "Камера недоступна"
-                }), 400
+                }, 400)
 
-            # Получаем JPEG кадр и декодируем в numpy array
-            jpeg_data = camera.get_frame_jpeg()
-            if jpeg_data is None:
-                return jsonify({
+            # Камера отдаёт кадры? Сам кадр берём уже декодированным из рантайма
+            if camera.get_frame_jpeg() is None:
+                return _json_response({
                     "success": False,
                     "error": "Нет кадров с камеры"
-                }), 400
-
-            # Декодируем JPEG в numpy array
-            nparr = np.frombuffer(jpeg_data, np.uint8)
-            frame = ai_runtime.last_frame_bgr.copy(
-            ) if ai_runtime and ai_runtime.last_frame_bgr is not None else None
+                }, 400)
 
-            if frame is None:
-                return jsonify({
+            if not ai_runtime or ai_runtime.last_frame_bgr is None:
+                return _json_response({
                     "success": False,
                     "error": "Ошибка декодирования кадра"
-                }), 400
+                }, 400)
 
-            # Детекция и отрисовка
-            detections = ai_runtime.last_detections if ai_runtime else []
-            annotated_frame = ai_detector.draw_detections(
-                frame.copy(), detections)
+            # Отрисовка и кодирование — в фоновом продюсере, не в потоке
+            # запроса; пока клиент опрашивает, аренда держит продюсер живым
+            broadcast = get_broadcast(1.0, _ANNOTATED_QUALITY)
+            broadcast.lease(_ANNOTATED_LEASE)
+            seq, jpeg, detections = broadcast.latest()
+            if jpeg is None:
+                # первый запрос: ждём первый кадр продюсера
+                broadcast.wait_for_new(0, _ANNOTATED_FIRST_WAIT)
+                seq, jpeg, detections = broadcast.latest()
+                if jpeg is None:
+                    return _json_response({
+                        "success": False,
+                        "error": "Ошибка кодирования"
+                    }, 500)
 
-            # Кодируем в base64
-            encode_param = [cv2.IMWRITE_JPEG_QUALITY, 80]
-            ret, buffer = cv2.imencode('.jpg', annotated_frame, encode_param)
+            # Кадр не сменился с прошлого опроса клиента — только заголовок.
+            # seq уникален в пределах продюсера, id() отличает пересозданный
+            etag = f'"{id(broadcast):x}-{seq}"'
+            if request.headers.get("If-None-Match") == etag:
+                return Response(status=304, headers={
+                    "ETag": etag, "Cache-Control": "no-cache"})
 
-            if not ret:
-                return jsonify({
-                    "success": False,
-                    "error": "Ошибка кодирования"
-                }), 500
+            # base64 считаем один раз на опубликованный кадр
+            entry = annotated_cache["entry"]
+            if entry is None or entry[0] != seq:
+                entry = (seq, base64.b64encode(jpeg).decode('utf-8'))
+                annotated_cache["entry"] = entry
 
-            frame_b64 = base64.b64encode(buffer).decode('utf-8')
+            frame_b64 = entry[1]
 
-            return jsonify({
+            response = _json_response({
                 "success": True,
                 "frame": frame_b64,
                 "detections": detections,
                 "timestamp": time.time()
             })
+            response.headers["ETag"] = etag
+            response.headers["Cache-Control"] = "no-cache"
+            return response
 
         except Exception as e:
-            logger.error(f"Ошибка аннотированного кадра: {e}")
-            return jsonify({
+            logger.error("Ошибка аннотированного кадра: %s", e)
+            return _json_response({
                 "success": False,
                 "error": str(e)
-            }), 500
+            }, 500)
 
     @bp.route("/ai/stream", methods=["GET"])
     def ai_stream():
@@ -89,84 +243,44 @@ def add_ai_detector_routes(bp: Blueprint, *, ai_detector, camera, ai_runtime, ok
             return Response(status=503)
 
         # параметры стрима из query
-        try:
-            target_fps = float(request.args.get("fps", 12))
-            target_fps = max(1.0, min(30.0, target_fps))
-        except Exception:
-            target_fps = 12.0
-
-        try:
-            # 0.5..1.0 обычно достаточно
-            scale = float(request.args.get("scale", 0.75))
-            scale = max(0.3, min(1.0, scale))
-        except Exception:
-            scale = 0.75
-
-        try:
-            quality = int(request.args.get("quality", 70))
-            quality = max(40, min(90, quality))
-        except Exception:
-            quality = 70
+        target_fps, scale, quality = _parse_stream_params(request.args)
 
         interval = 1.0 / target_fps
 
+        broadcast = get_broadcast(scale, quality)
+
         def generate():
-            import time
-            last_ts_used = None
-            cached_jpeg = None  # если кадр не обновился — повторно не кодируем
-
-            while True:
-                try:
-                    # Берём последний кадр из рантайма
-                    frame = ai_runtime.last_frame_bgr
-                    detections = ai_runtime.last_detections or []
-
-                    if frame is None:
-                        time.sleep(0.05)
-                        continue
-
-                    # Определяем — обновился ли буфер
-                    ts = ai_runtime.last_ts
-                    need_reencode = (ts != last_ts_used) or (
-                        cached_jpeg is None)
-
-                    if need_reencode:
-                        # Рисуем только по кэшированным детекциям
-                        annotated = ai_detector.draw_detections(
-                            frame.copy(), detections)
-
-                        # Даунскейлим при необходимости
-                        if scale != 1.0:
-                            h, w = annotated.shape[:2]
-                            new_w = max(1, int(w * scale))
-                            new_h = max(1, int(h * scale))
-                            annotated = cv2.resize(
-                                annotated, (new_w, new_h), interpolation=cv2.INTER_AREA)
-
-                        # Кодируем JPEG
-                        ok, buffer = cv2.imencode(
-                            ".jpg", annotated, [cv2.IMWRITE_JPEG_QUALITY, quality])
-                        if not ok:
-                            time.sleep(interval)
+            last_seq = 0
+            deadline = time.monotonic()  # темп по монотонным часам, без дрейфа
+            broadcast.subscribe()
+            try:
+                while True:
+                    try:
+                        # Кадр кодирует общий продюсер; ждём новый не дольше интервала
+                        last_seq, frame_data = broadcast.wait_for_new(
+                            last_seq, interval)
+                        if frame_data is None:
                             continue
 
-                        cached_jpeg = buffer.tobytes()
-                        last_ts_used = ts
-
-                    # Отдаём последнюю закодированную версию
-                    frame_data = cached_jpeg
-                    yield (b"--frame\r\n"
-                           b"Content-Type: image/jpeg\r\n"
-                           b"Content-Length: " + str(len(frame_data)).encode() + b"\r\n\r\n" +
-                           frame_data + b"\r\n")
+                        # Отдаём последнюю закодированную версию
+                        yield mjpeg_part(frame_data)
 
-                    time.sleep(interval)
+                        # Спим только остаток интервала; если отстали больше
+                        # чем на интервал — не догоняем, а сдвигаем дедлайн
+                        deadline += interval
+                        sleep_for = deadline - time.monotonic()
+                        if sleep_for > 0:
+                            time.sleep(sleep_for)
+                        else:
+                            deadline = time.monotonic()
 
-                except GeneratorExit:
-                    break
-                except Exception as e:
-                    logger.error(f"Ошибка в AI стриме: {e}")
-                    time.sleep(0.2)
+                    except GeneratorExit:
+                        break
+                    except Exception as e:
+                        logger.error("Ошибка в AI стриме: %s", e)
+                        time.sleep(0.2)
+            finally:
+                broadcast.unsubscribe()
 
         return Response(
             generate(),
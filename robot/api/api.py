@@ -1,22 +1,30 @@
 # robot/api/api.py
 
 from __future__ import annotations
+import base64
+import hashlib
+import hmac
 import logging
+import os
+import secrets
 import signal
+import threading
 import time
 from datetime import datetime
 from flask import Flask, Blueprint, app, jsonify, request, render_template, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS  # ДОБАВЛЯЕМ CORS
 from pathlib import Path
+from types import MappingProxyType
 
 from robot.ai_vision.ai_runtime import AIVisionRuntime
 import json
 from robot.controller import RobotController
 from robot.devices.camera import USBCamera, CameraConfig, list_available_cameras
 from robot.controllers.heading_controller import HeadingHoldService
-from robot.ai_vision.simple_ai_detector import SimpleAIDetector
 from robot.api.ai_detector_api import add_ai_detector_routes
-from robot.config import LOG_LEVEL, LOG_FMT, API_KEY, SPEED_MIN, SPEED_MAX, CAMERA_SAVE_PATH, CAMERA_VIDEO_PATH, CAMERA_AVAILABLE, CAMERA_CONFIG, LIGHT_INIT, STATIC_DIR, TEMPLATES_DIR, DEFAULT_SPEED
+from robot.api.mjpeg import BLACK_PART, FrameBroadcast, mjpeg_part
+from robot.config import LOG_LEVEL, LOG_FMT, API_KEY, SPEED_MIN, SPEED_MAX, CAMERA_SAVE_PATH, CAMERA_VIDEO_PATH, CAMERA_AVAILABLE, CAMERA_CONFIG, LIGHT_INIT, ENABLE_AI, STATIC_DIR, TEMPLATES_DIR, DEFAULT_SPEED
 from datetime import datetime
 from pathlib import Path
 
@@ -28,13 +36,184 @@ try:
     AI_API_AVAILABLE = True
 except ImportError as e:
     AI_API_AVAILABLE = False
-    logging.warning(f"⚠️ AI API недоступно: {e}")
+    logging.warning("⚠️ AI API недоступно: %s", e)
+
+# orjson сериализует в нативном коде; без него остаётся стандартный провайдер
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class _OrjsonProvider(DefaultJSONProvider):
+    """JSON-провайдер Flask поверх orjson (jsonify, app.json.dumps)"""
+
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY if ORJSON_AVAILABLE else 0
+
+    def _option(self) -> int:
+        return self._OPTIONS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=self._option()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        # bytes из orjson уходят в ответ без промежуточной str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self._option()),
+            mimetype=self.mimetype)
+
+
+# Каркас ответа ok() в байтах: {"success":true,"data":...,"timestamp":"..."}
+_OK_PREFIX = b'{"success":true,"data":'
+_TS_PREFIX = b',"timestamp":"'
+_TS_SUFFIX = b'"}'
+
+
+# gzip для крупных JSON-ответов (списки файлов, статусы); необязателен
+try:
+    from flask_compress import Compress
+    COMPRESS_AVAILABLE = True
+except ImportError:
+    COMPRESS_AVAILABLE = False
+
+
+# Расширения медиафайлов: кортеж для str.endswith (проверка в C)
+PHOTO_EXTS = (".jpg", ".jpeg", ".png")
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv")
+
+# Пустое тело запроса: один неизменяемый объект вместо нового dict
+_EMPTY = MappingProxyType({})
+
+
+def _clamp_speed(v, lo=SPEED_MIN, hi=SPEED_MAX) -> int:
+    v = int(v)
+    return lo if v < lo else hi if v > hi else v
+
+
+def _speed_from_request(default) -> int:
+    """
+    Скорость из JSON-тела запроса, зажатая в SPEED_MIN..SPEED_MAX.
+    Пустое тело — default; тело не JSON-объект или скорость не целое —
+    ValueError: команду движения не выполняем
+    """
+    if not request.get_data(cache=True):
+        data = _EMPTY
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError("Тело запроса должно быть JSON-объектом")
+    speed = data.get("speed", default)
+    # bool — подкласс int, но скоростью не считается
+    if not isinstance(speed, int) or isinstance(speed, bool):
+        raise ValueError("Неверный формат скорости")
+    return _clamp_speed(speed)
+
+
+# ISO-время для ok()/err(): пересчитывается не чаще раза в секунду.
+# Гонка между потоками безопасна — в худшем случае посчитаем дважды
+_ts_cache = [0.0, ""]
+
+
+def _now_iso() -> str:
+    t = time.time()
+    c = _ts_cache
+    if t - c[0] >= 1.0:
+        c[1] = datetime.fromtimestamp(t).isoformat(timespec="seconds")
+        c[0] = t
+    return c[1]
+
+
+class _LazyProxy:
+    """
+    Объект создаётся фабрикой при первом обращении к атрибуту или проверке
+    на истинность. Неудачная инициализация запоминается (одна строка в
+    логе): дальше прокси ложен, как None в старом пути «AI недоступен».
+    is_loaded позволяет узнать состояние, не создавая объект.
+    """
+
+    def __init__(self, factory, name: str):
+        self._factory = factory
+        self._name = name
+        self._lock = threading.Lock()
+        self._obj = None
+        self._error = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._obj is not None
+
+    def _get(self):
+        obj = self._obj
+        if obj is not None:
+            return obj
+        with self._lock:
+            if self._obj is None:
+                # неудачную инициализацию не повторяем на каждом запросе
+                if self._error is not None:
+                    raise RuntimeError(f"{self._name} недоступен: {self._error}")
+                try:
+                    self._obj = self._factory()
+                    logger.info("✅ %s создан по первому запросу", self._name)
+                except Exception as e:
+                    self._error = e
+                    logger.error("Ошибка инициализации %s: %s", self._name, e)
+                    raise
+            return self._obj
+
+    def __bool__(self) -> bool:
+        if self._obj is not None:
+            return True
+        if self._error is not None:
+            return False
+        try:
+            self._get()
+        except Exception:
+            return False
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+class _TTLCache:
+    """Кэш одного значения с коротким TTL: N одновременных опросов -> 1 вызов"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ts = 0.0
+        self._val = None
+
+    def get_or_call(self, fn):
+        now = time.monotonic()
+        with self._lock:
+            if self._val is not None and now - self._ts < self.ttl:
+                return self._val
+            self._val = fn()
+            self._ts = now
+            return self._val
 
 
 def create_app(controller: RobotController | None = None, camera_instance: USBCamera | None = None) -> Flask:
     app = Flask(__name__, template_folder=TEMPLATES_DIR,
                 static_folder=STATIC_DIR)
+    if ORJSON_AVAILABLE:
+        app.json = _OrjsonProvider(app)
+    # без сортировки ключей и отступов — меньше CPU и байт на ответ
+    app.json.sort_keys = False
+    app.json.compact = True
     CORS(app, origins="*", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
+    if COMPRESS_AVAILABLE:
+        # только JSON: JPEG/MJPEG уже сжаты, SSE нельзя буферизовать
+        app.config["COMPRESS_MIMETYPES"] = ["application/json"]
+        app.config["COMPRESS_MIN_SIZE"] = 1024
+        app.config["COMPRESS_ALGORITHM"] = "gzip"
+        Compress(app)
 
     STATIC_ROOT = Path(app.static_folder).resolve()
 
@@ -42,6 +221,10 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
     VIDEOS_DIR = Path(CAMERA_VIDEO_PATH)
     PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
     VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
+    # корни для проверки удаления: резолвим один раз; os.sep в конце,
+    # чтобы /photos не совпадал с /photos_old
+    DELETE_ROOTS = (str(PHOTOS_DIR.resolve()) + os.sep,
+                    str(VIDEOS_DIR.resolve()) + os.sep)
 
     robot = controller or RobotController()
 
@@ -52,7 +235,7 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
         logger.info("🧭 HeadingHold запущен")
 
     except Exception as e:
-        logger.error(f"🧭 Ошибка запуска HeadingHold: {e}")
+        logger.error("🧭 Ошибка запуска HeadingHold: %s", e)
         heading = None
 
     camera = camera_instance
@@ -80,6 +263,9 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
                         quality=CAMERA_CONFIG['quality'],
                         stream_quality=CAMERA_CONFIG['stream_quality'],
                         stream_fps=CAMERA_CONFIG['stream_fps'],
+                        stream_passthrough=CAMERA_CONFIG['stream_passthrough'],
+                        pin_cores=CAMERA_CONFIG['pin_cores'],
+                        stream_grayscale=CAMERA_CONFIG['stream_grayscale'],
                         brightness=CAMERA_CONFIG['brightness'],
                         contrast=CAMERA_CONFIG['contrast'],
                         saturation=CAMERA_CONFIG['saturation'],
@@ -89,7 +275,7 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
                     )
                     camera = USBCamera(camera_config)
                     logger.info(
-                        f"🎥 Камера инициализирована: /dev/video{device_id}")
+                        "🎥 Камера инициализирована: /dev/video%s", device_id)
                 else:
                     logger.warning("🎥 USB камеры не найдены")
                     camera = None
@@ -97,48 +283,116 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
                 logger.warning("🎥 OpenCV недоступен")
                 camera = None
         except Exception as e:
-            logger.error(f"🎥 Ошибка инициализации камеры: {e}")
+            logger.error("🎥 Ошибка инициализации камеры: %s", e)
             camera = None
 
     # ==================== AI ИНТЕГРАЦИЯ ====================
 
-    # Создаем AI контроллер робота
+    # Детектор (YOLO + torch) и фоновая инференс-петля создаются лениво —
+    # при первом обращении AI-эндпоинта; ROBOT_ENABLE_AI=0 отключает AI совсем
     ai_detector = None
+    ai_runtime = None
 
-    # Заменяем обычное AI зрение на домашнее
-    if camera and CAMERA_AVAILABLE and not LIGHT_INIT:
-        try:
-            ai_detector = SimpleAIDetector()
-            logger.info("✅ AI детектор инициализирован")
-        except Exception as e:
-            logger.error(f"Ошибка инициализации AI детектора: {e}")
-            ai_detector = None
+    if ENABLE_AI and camera and CAMERA_AVAILABLE and not LIGHT_INIT:
+        def _make_detector():
+            # импорт здесь: ultralytics/torch грузятся только вместе с моделью
+            from robot.ai_vision.simple_ai_detector import SimpleAIDetector
+            return SimpleAIDetector()
 
-    ai_runtime = None
-    if ai_detector and camera:
-        try:
-            ai_runtime = AIVisionRuntime(ai_detector, camera, target_fps=10)
-            logger.info("✅ AI runtime запущен (фоновая инференс-петля)")
-        except Exception as e:
-            logger.error(f"Ошибка запуска AI runtime: {e}")
-            ai_runtime = None
+        def _make_runtime():
+            # без детектора инференс-петля падала бы на каждом кадре
+            if not ai_detector:
+                raise RuntimeError("AI детектор недоступен")
+            return AIVisionRuntime(ai_detector, camera, target_fps=10)
+
+        ai_detector = _LazyProxy(_make_detector, "AI детектор")
+        ai_runtime = _LazyProxy(_make_runtime, "AI runtime")
+        logger.info("✅ AI подключено (ленивая инициализация)")
+    elif not ENABLE_AI:
+        logger.info("ℹ️ AI отключено (ROBOT_ENABLE_AI=0)")
 
     # API Blueprint
     bp = Blueprint("api", __name__)
 
     # ==================== УТИЛИТЫ ОТВЕТОВ ====================
 
+    # Access-Control-Allow-Origin выставляет flask_cors (CORS выше)
     def ok(data=None, code=200):
-        resp = jsonify({"success": True, "data": data or {},
-                        "timestamp": datetime.now().isoformat()})
-        resp.headers['Access-Control-Allow-Origin'] = '*'
-        return resp, code
+        if ORJSON_AVAILABLE:
+            # обёртка — готовые байты, кодируем только data
+            body = orjson.dumps(data, default=app.json.default,
+                                option=_OrjsonProvider._OPTIONS) if data else b"{}"
+            return app.response_class(
+                b"".join((_OK_PREFIX, body, _TS_PREFIX,
+                          _now_iso().encode(), _TS_SUFFIX)),
+                mimetype="application/json"), code
+        return jsonify({"success": True, "data": data or {},
+                        "timestamp": _now_iso()}), code
 
     def err(msg, code=400):
-        resp = jsonify({"success": False, "error": msg,
-                       "timestamp": datetime.now().isoformat()})
-        resp.headers['Access-Control-Allow-Origin'] = '*'
-        return resp, code
+        return jsonify({"success": False, "error": msg,
+                        "timestamp": _now_iso()}), code
+
+    # ==================== АУТЕНТИФИКАЦИЯ ====================
+
+    # API_KEY = None — аутентификация выключена (см. config), хуки не ставятся.
+    # Скрипты шлют ключ в заголовке X-API-Key. Браузер (fetch, EventSource и
+    # <img> заголовок не передают) один раз отправляет ключ в POST /api/login
+    # и получает cookie сессии "время.nonce.HMAC(API_KEY)": сам ключ не
+    # попадает ни в cookie, ни в URL, смена API_KEY отзывает все сессии
+    _api_key_bytes = API_KEY.encode() if API_KEY else None
+    _SESSION_COOKIE = "robot_session"
+    _SESSION_MAX_AGE = 12 * 3600  # сек
+
+    def _key_ok(got: str) -> bool:
+        # сравнение за постоянное время — без утечки по таймингу
+        return hmac.compare_digest(got.encode(), _api_key_bytes)
+
+    def _session_sign(payload: str) -> str:
+        return hmac.new(_api_key_bytes, payload.encode(), hashlib.sha256).hexdigest()
+
+    def _new_session() -> str:
+        payload = f"{int(time.time())}.{secrets.token_hex(16)}"
+        return f"{payload}.{_session_sign(payload)}"
+
+    def _session_ok(token: str) -> bool:
+        payload, _, sig = token.rpartition(".")
+        issued = payload.partition(".")[0]
+        if not issued.isdigit() or time.time() - int(issued) > _SESSION_MAX_AGE:
+            return False
+        return hmac.compare_digest(sig, _session_sign(payload))
+
+    if _api_key_bytes is not None:
+        @app.before_request
+        def _auth():
+            # статика и страница без ключа; preflight CORS и вход — тоже
+            if (request.path[:5] != "/api/" or request.method == "OPTIONS"
+                    or request.path == "/api/login"):
+                return None
+            if _key_ok(request.headers.get("X-API-Key", "")):
+                return None
+            if _session_ok(request.cookies.get(_SESSION_COOKIE, "")):
+                return None
+            return err("unauthorized", 401)
+
+        @bp.route("/login", methods=["POST"])
+        def api_login():
+            """Вход браузера: ключ в JSON-теле -> cookie сессии"""
+            data = request.get_json(silent=True)
+            got = data.get("api_key") if isinstance(data, dict) else None
+            if not isinstance(got, str) or not _key_ok(got):
+                return err("unauthorized", 401)
+            resp, code = ok({"expires_in": _SESSION_MAX_AGE})
+            resp.set_cookie(_SESSION_COOKIE, _new_session(),
+                            max_age=_SESSION_MAX_AGE, httponly=True,
+                            samesite="Strict", secure=request.is_secure)
+            return resp, code
+
+        @bp.route("/logout", methods=["POST"])
+        def api_logout():
+            resp, code = ok()
+            resp.delete_cookie(_SESSION_COOKIE)
+            return resp, code
 
     # ==================== ГЛАВНАЯ СТРАНИЦА ====================
 
@@ -149,20 +403,35 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
 
     # === SSE /api/events — единый канал телеметрии ===
 
+    # Снимки статусов (до 5 Гц): SSE-вкладки и /status, /health,
+    # /camera/status делят один опрос железа за тик
+    _robot_status_cache = _TTLCache(0.2)
+    _camera_status_cache = _TTLCache(0.2)
+
+    def _status_snapshot(cache: _TTLCache, get_status) -> dict:
+        """Копия снимка статуса; ?fresh=1 — опросить железо прямо сейчас"""
+        if request.args.get("fresh") == "1":
+            return get_status()
+        # снимок общий для всех запросов — отдаём копию под дописывание полей
+        return dict(cache.get_or_call(get_status))
+
     @app.route("/api/events", methods=["GET"])
     def events():
         def gen():
             while True:
                 try:
-                    robot_status = app.robot.get_status() if hasattr(
+                    robot_status = _robot_status_cache.get_or_call(app.robot.get_status) if hasattr(
                         app, "robot") and app.robot else {}
-                    cam_status = app.camera.get_status() if app.camera else {}
+                    cam_status = _camera_status_cache.get_or_call(
+                        app.camera.get_status) if app.camera else {}
 
+                    # телеметрия не должна сама запускать AI
+                    ai_live = ai_runtime if ai_runtime is not None and ai_runtime.is_loaded else None
                     ai_block = {
-                        "fps": (ai_runtime.ai_fps if ai_runtime else 0.0),
-                        "count": (len(ai_runtime.last_detections) if ai_runtime else 0),
-                        "last_ts": (ai_runtime.last_ts if ai_runtime else 0.0),
-                        "detections": ai_runtime.last_detections if ai_runtime else [],
+                        "fps": (ai_live.ai_fps if ai_live else 0.0),
+                        "count": (len(ai_live.last_detections) if ai_live else 0),
+                        "last_ts": (ai_live.last_ts if ai_live else 0.0),
+                        "detections": ai_live.last_detections if ai_live else [],
                     }
 
                     payload = {
@@ -191,67 +460,39 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
 
     # ==================== API МАРШРУТЫ ДВИЖЕНИЯ ====================
 
-    @bp.route("/move/forward", methods=["POST"])
-    def move_forward():
-        data = request.get_json() or {}
-        speed = int(data.get("speed", DEFAULT_SPEED))
-        speed = max(SPEED_MIN, min(SPEED_MAX, speed))
-
-        success = robot.move_forward(speed)
-        return ok({
-            "command": "move_forward",
-            "speed": speed,
-            "success": success,
-            **robot.get_status()
-        })
-
-    @bp.route("/move/backward", methods=["POST"])
-    def move_backward():
-        data = request.get_json() or {}
-        speed = int(data.get("speed", DEFAULT_SPEED))
-        speed = max(SPEED_MIN, min(SPEED_MAX, speed))
-
-        success = robot.move_backward(speed)
-        return ok({
-            "command": "move_backward",
-            "speed": speed,
-            "success": success,
-            **robot.get_status()
-        })
-
-    @bp.route("/turn/left", methods=["POST"])
-    def turn_left():
-        data = request.get_json() or {}
-        speed = int(data.get("speed", DEFAULT_SPEED))
-        speed = max(SPEED_MIN, min(SPEED_MAX, speed))
-
-        success = robot.tank_turn_left(speed)
-        return ok({
-            "command": "tank_turn_left",
-            "speed": speed,
-            "success": success,
-            **robot.get_status()
-        })
-
-    @bp.route("/turn/right", methods=["POST"])
-    def turn_right():
-        data = request.get_json() or {}
-        speed = int(data.get("speed", DEFAULT_SPEED))
-        speed = max(SPEED_MIN, min(SPEED_MAX, speed))
+    def _make_move(command: str, method):
+        """Обработчик команды движения: скорость из тела, ответ со статусом"""
+        def handler():
+            try:
+                speed = _speed_from_request(DEFAULT_SPEED)
+            except ValueError as e:
+                return err(str(e), 400)
 
-        success = robot.tank_turn_right(speed)
-        return ok({
-            "command": "tank_turn_right",
-            "speed": speed,
-            "success": success,
-            **robot.get_status()
-        })
+            success = method(speed)
+            return ok({
+                "command": command,
+                "speed": speed,
+                "success": success,
+                **robot.get_status()
+            })
+        handler.__name__ = command
+        return handler
+
+    # имена эндпоинтов — как у прежних функций (url_for не ломается)
+    for rule, endpoint, command, method in (
+        ("/move/forward", "move_forward", "move_forward", robot.move_forward),
+        ("/move/backward", "move_backward", "move_backward", robot.move_backward),
+        ("/turn/left", "turn_left", "tank_turn_left", robot.tank_turn_left),
+        ("/turn/right", "turn_right", "tank_turn_right", robot.tank_turn_right),
+    ):
+        bp.add_url_rule(rule, endpoint, _make_move(command, method), methods=["POST"])
 
     @bp.route("/speed", methods=["POST"])
     def update_speed():
-        data = request.get_json() or {}
-        new_speed = int(data.get("speed", 0))
-        new_speed = max(SPEED_MIN, min(SPEED_MAX, new_speed))
+        try:
+            new_speed = _speed_from_request(0)
+        except ValueError as e:
+            return err(str(e), 400)
 
         success = robot.update_speed(new_speed)
         status = robot.get_status()
@@ -442,105 +683,40 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
             }
         })
 
-    @bp.route("/camera/pan/left", methods=["POST"])
-    def camera_pan_left():
-        """Повернуть камеру влево на шаг"""
-        data = request.get_json() or {}
-        step = data.get("step")  # опциональный параметр
-
-        if step is not None:
-            try:
-                step = int(step)
-            except (TypeError, ValueError):
-                return err("Неверный формат шага", 400)
-
-        success = robot.pan_left(step)
-        pan_angle, tilt_angle = robot.get_camera_angles()
-
-        return ok({
-            "command": "pan_left",
-            "step": step,
-            "success": success,
-            "camera": {
-                "pan_angle": pan_angle,
-                "tilt_angle": tilt_angle
-            }
-        })
-
-    @bp.route("/camera/pan/right", methods=["POST"])
-    def camera_pan_right():
-        """Повернуть камеру вправо на шаг"""
-        data = request.get_json() or {}
-        step = data.get("step")  # опциональный параметр
+    def _make_camera_step(command: str, method):
+        """Обработчик поворота камеры на шаг (step в теле — опционально)"""
+        def handler():
+            data = request.get_json() or {}
+            step = data.get("step")  # опциональный параметр
 
-        if step is not None:
-            try:
-                step = int(step)
-            except (TypeError, ValueError):
-                return err("Неверный формат шага", 400)
-
-        success = robot.pan_right(step)
-        pan_angle, tilt_angle = robot.get_camera_angles()
-
-        return ok({
-            "command": "pan_right",
-            "step": step,
-            "success": success,
-            "camera": {
-                "pan_angle": pan_angle,
-                "tilt_angle": tilt_angle
-            }
-        })
-
-    @bp.route("/camera/tilt/up", methods=["POST"])
-    def camera_tilt_up():
-        """Наклонить камеру вверх на шаг"""
-        data = request.get_json() or {}
-        step = data.get("step")  # опциональный параметр
-
-        if step is not None:
-            try:
-                step = int(step)
-            except (TypeError, ValueError):
-                return err("Неверный формат шага", 400)
-
-        success = robot.tilt_up(step)
-        pan_angle, tilt_angle = robot.get_camera_angles()
-
-        return ok({
-            "command": "tilt_up",
-            "step": step,
-            "success": success,
-            "camera": {
-                "pan_angle": pan_angle,
-                "tilt_angle": tilt_angle
-            }
-        })
+            if step is not None:
+                try:
+                    step = int(step)
+                except (TypeError, ValueError):
+                    return err("Неверный формат шага", 400)
 
-    @bp.route("/camera/tilt/down", methods=["POST"])
-    def camera_tilt_down():
-        """Наклонить камеру вниз на шаг"""
-        data = request.get_json() or {}
-        step = data.get("step")  # опциональный параметр
+            success = method(step)
+            pan_angle, tilt_angle = robot.get_camera_angles()
 
-        if step is not None:
-            try:
-                step = int(step)
-            except (TypeError, ValueError):
-                return err("Неверный формат шага", 400)
+            return ok({
+                "command": command,
+                "step": step,
+                "success": success,
+                "camera": {
+                    "pan_angle": pan_angle,
+                    "tilt_angle": tilt_angle
+                }
+            })
+        handler.__name__ = command
+        return handler
 
-        success = robot.tilt_down(step)
-        pan_angle, tilt_angle = robot.get_camera_angles()
-
-        return ok({
-            "command": "tilt_down",
-            "step": step,
-            "success": success,
-            "camera": {
-                "pan_angle": pan_angle,
-                "tilt_angle": tilt_angle
-            }
-        })
+    for rule, endpoint, command, method in (
+        ("/camera/pan/left", "camera_pan_left", "pan_left", robot.pan_left),
+        ("/camera/pan/right", "camera_pan_right", "pan_right", robot.pan_right),
+        ("/camera/tilt/up", "camera_tilt_up", "tilt_up", robot.tilt_up),
+        ("/camera/tilt/down", "camera_tilt_down", "tilt_down", robot.tilt_down),
+    ):
+        bp.add_url_rule(rule, endpoint, _make_camera_step(command, method), methods=["POST"])
 
     @bp.route("/camera/limits", methods=["GET"])
     def camera_limits():
@@ -807,7 +983,7 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
 
         return ok({
             "available": True,
-            **camera.get_status()
+            **_status_snapshot(_camera_status_cache, camera.get_status)
         })
 
     @bp.route("/camera/photo", methods=["POST"])
@@ -822,6 +998,7 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
         success, result = camera.take_photo(filename)
 
         if success:
+            _forget_files(PHOTOS_DIR)
             return ok({
                 "command": "take_photo",
                 "filepath": result,
@@ -861,6 +1038,7 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
         success, result = camera.stop_recording()
 
         if success:
+            _forget_files(VIDEOS_DIR)
             return ok({
                 "command": "stop_recording",
                 "filepath": result,
@@ -899,61 +1077,84 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
 
     # ==================== ВИДЕОПОТОК ====================
 
+    # Один продюсер на всех зрителей /camera/stream: кадр камеры берётся
+    # один раз, генераторы получают одну и ту же ссылку на bytes
+    def _camera_stream_fps() -> float:
+        if camera and hasattr(camera.config, 'stream_fps'):
+            return max(camera.config.stream_fps, 5)
+        return 10
+
+    _last_camera_seq = {"seq": 0}
+
+    def _camera_connected() -> bool:
+        return bool(camera and getattr(camera, "status", None) and getattr(camera.status, "is_connected", False))
+
+    def _produce_camera_frame():
+        if not _camera_connected():
+            return None
+        # ждём новый JPEG от камеры (не дольше периода стрима) вместо опроса
+        seq, frame_data = camera.wait_for_frame(
+            _last_camera_seq["seq"], 1.0 / _camera_stream_fps())
+        if not frame_data or seq == _last_camera_seq["seq"]:
+            return None
+        _last_camera_seq["seq"] = seq
+        return frame_data, None
+
+    camera_broadcast = FrameBroadcast(
+        _produce_camera_frame, 1.0 / _camera_stream_fps(), name="camera-stream")
+
     @app.route("/camera/stream")
     def camera_stream():
         """MJPEG стрим камеры"""
 
         def generate():
             """Генератор кадров для MJPEG стрима"""
-            # Заглушка - черный квадрат в JPEG
-            import base64
-            BLACK_JPEG_B64 = '/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQH/2wBDAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQH/wAARCAABAAEDASIAAhEBAxEB/8QAFQABAQAAAAAAAAAAAAAAAAAAAAv/xAAUEAEAAAAAAAAAAAAAAAAAAAAA/8QAFQEBAQAAAAAAAAAAAAAAAAAAAAX/xAAUEQEAAAAAAAAAAAAAAAAAAAAA/9oADAMBAAIRAxEAPwA/gA=='
-            BLACK_JPEG = base64.b64decode(BLACK_JPEG_B64)
-
             logger.info("Запущен MJPEG генератор")
-
-            while True:
-                try:
-                    frame_data = None
-
-                    # Пытаемся получить кадр от камеры
-                    if camera and getattr(camera, "status", None) and getattr(camera.status, "is_connected", False):
-                        frame_data = camera.get_frame_jpeg()
-
-                    # Если нет кадра - используем заглушку
-                    if not frame_data:
-                        frame_data = BLACK_JPEG
-
-                    # Отправляем кадр в MJPEG формате
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n'
-                           b'Content-Length: ' +
-                           str(len(frame_data)).encode() + b'\r\n'
-                           b'\r\n' + frame_data + b'\r\n')
-
-                    # Контролируем FPS
-                    if camera and hasattr(camera.config, 'stream_fps'):
-                        fps = max(camera.config.stream_fps, 5)
-                    else:
-                        fps = 10
-
-                    time.sleep(1.0 / fps)
-
-                except GeneratorExit:
-                    logger.info("MJPEG генератор остановлен")
-                    break
-                except Exception as e:
-                    logger.error(f"Ошибка в MJPEG генераторе: {e}")
-                    # При ошибке отправляем заглушку
+            last_seq = 0
+            subscribed = False
+            try:
+                while True:
                     try:
-                        yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n'
-                               b'Content-Length: ' +
-                               str(len(BLACK_JPEG)).encode() + b'\r\n'
-                               b'\r\n' + BLACK_JPEG + b'\r\n')
-                    except:
+                        # Камеры нет или она отключена: готовая заглушка раз
+                        # в секунду держит соединение, продюсер не крутится
+                        if not _camera_connected():
+                            if subscribed:
+                                camera_broadcast.unsubscribe()
+                                subscribed = False
+                            yield BLACK_PART
+                            time.sleep(1.0)
+                            continue
+                        if not subscribed:
+                            camera_broadcast.subscribe()
+                            subscribed = True
+
+                        # Ждём новый кадр от общего продюсера; нет кадра
+                        # дольше секунды — отправляем заглушку
+                        seq, frame_data = camera_broadcast.wait_for_new(
+                            last_seq, 1.0)
+
+                        # Отправляем кадр в MJPEG формате; без кадра — готовую заглушку
+                        if seq != last_seq and frame_data:
+                            last_seq = seq
+                            # одна запись в сокет на кадр: части склеены join
+                            yield mjpeg_part(frame_data)
+                        else:
+                            yield BLACK_PART
+
+                    except GeneratorExit:
+                        logger.info("MJPEG генератор остановлен")
                         break
-                    time.sleep(1.0)
+                    except Exception as e:
+                        logger.error("Ошибка в MJPEG генераторе: %s", e)
+                        # При ошибке отправляем заглушку
+                        try:
+                            yield BLACK_PART
+                        except:
+                            break
+                        time.sleep(1.0)
+            finally:
+                if subscribed:
+                    camera_broadcast.unsubscribe()
 
         response = Response(
             generate(),
@@ -968,50 +1169,119 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
         )
         return response
 
+    # ETag кадра: номер меняется, когда камера отдаёт новый объект bytes;
+    # метка запуска не даёт совпасть номерам после рестарта сервиса.
+    # base64 кэшируется при том же кадре, что и ETag, — тело ответа
+    # всегда из тех же байт, по которым посчитан ETag
+    _frame_tag = {"data": None, "seq": 0, "b64": None, "boot": int(time.time())}
+    _frame_tag_lock = threading.Lock()
+
+    def _frame_etag(frame_data: bytes) -> str:
+        with _frame_tag_lock:
+            if frame_data is not _frame_tag["data"]:
+                _frame_tag.update(data=frame_data, b64=None,
+                                  seq=_frame_tag["seq"] + 1)
+            return f'W/"{_frame_tag["boot"]:x}-{_frame_tag["seq"]}"'
+
+    def _frame_b64(frame_data: bytes) -> str:
+        """base64 кадра — раз на кадр, общий для всех опросов"""
+        with _frame_tag_lock:
+            if frame_data is _frame_tag["data"] and _frame_tag["b64"] is not None:
+                return _frame_tag["b64"]
+        # кодируем вне лока
+        b64 = base64.b64encode(frame_data).decode('utf-8')
+        with _frame_tag_lock:
+            if frame_data is _frame_tag["data"]:
+                _frame_tag["b64"] = b64
+        return b64
+
     @bp.route("/camera/frame", methods=["GET"])
     def get_frame():
         """Получить один кадр в формате base64"""
         if not camera:
             return err("Камера недоступна", 404)
 
-        frame_b64 = camera.get_frame_base64()
-
-        if frame_b64:
-            return ok({
-                "frame": frame_b64,
-                "format": "base64_jpeg",
-                "timestamp": time.time()
-            })
-        else:
+        frame_data = camera.get_frame_jpeg()
+        if not frame_data:
             return err("Нет доступных кадров")
 
+        # Клиент уже видел этот кадр — отвечаем без тела
+        etag = _frame_etag(frame_data)
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status=304, headers={"ETag": etag})
+
+        resp, code = ok({
+            # тот же кадр, что и в ETag; опросы делят одну кодировку
+            "frame": _frame_b64(frame_data),
+            "format": "base64_jpeg",
+            "timestamp": time.time()
+        })
+        resp.headers["ETag"] = etag
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp, code
+
     def _collect_files(dir_path: str | Path, exts: tuple[str, ...]) -> list[dict]:
         base = Path(dir_path)
         base.mkdir(parents=True, exist_ok=True)
 
+        # каталог резолвим один раз, а не каждый файл
+        base_abs = str(base.resolve())
+        # путь относительно /static
+        url_prefix = f"/static/{Path(base_abs).relative_to(STATIC_ROOT).as_posix()}/"
+
         items = []
-        for f in base.iterdir():
-            if f.is_file() and f.suffix.lower() in exts:
-                stat = f.stat()
+        # scandir: DirEntry кэширует тип и stat, без Path-объекта на файл
+        with os.scandir(base_abs) as it:
+            for entry in it:
+                name = entry.name
+                if not name.lower().endswith(exts) or not entry.is_file():
+                    continue
+                stat = entry.stat()
                 created = int(stat.st_mtime)
-                # путь относительно /static
-                rel = f.resolve().relative_to(STATIC_ROOT)
-                url = f"/static/{rel.as_posix()}"
                 items.append({
-                    "filename": f.name,
-                    "path": str(f.resolve()),     # для удаления
-                    "url": url,                   # ← фронт будет использовать это
+                    "filename": name,
+                    "path": os.path.join(base_abs, name),  # для удаления
+                    "url": url_prefix + name,              # ← фронт будет использовать это
                     "size": stat.st_size,
                     "created": created,
-                    "created_str": datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S"),
+                    "created_str": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created)),
                 })
         items.sort(key=lambda x: x["created"], reverse=True)
         return items
 
+    # Список файлов по каталогу: (st_mtime_ns каталога, когда сканировали,
+    # files). Добавление, удаление и переименование меняют mtime каталога —
+    # тогда пересканируем. Перезапись файла под тем же именем mtime каталога
+    # не меняет: фото/запись через API сбрасывают кэш сами, остальное
+    # (автостоп записи, снимки из AI) ловит короткий TTL
+    _dir_cache: dict[str, tuple[int, float, list]] = {}
+    _DIR_CACHE_TTL = 5.0
+
+    def _forget_files(dir_path: Path) -> None:
+        _dir_cache.pop(os.fspath(dir_path), None)
+
+    def _cached_files(dir_path: Path, exts: tuple[str, ...], volatile: bool = False) -> list[dict]:
+        key = os.fspath(dir_path)
+        try:
+            # mtime берём до сканирования: изменение во время скана
+            # не останется незамеченным
+            mtime = os.stat(key).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        now = time.monotonic()
+        entry = _dir_cache.get(key)
+        if (not volatile and entry is not None and mtime is not None
+                and entry[0] == mtime and now - entry[1] < _DIR_CACHE_TTL):
+            return entry[2]
+        files = _collect_files(dir_path, exts)
+        if mtime is not None:
+            _dir_cache[key] = (mtime, now, files)
+        return files
+
     @bp.route("/files/photos", methods=["GET"])
     def files_photos():
         try:
-            files = _collect_files(PHOTOS_DIR, (".jpg", ".jpeg", ".png"))
+            files = _cached_files(PHOTOS_DIR, PHOTO_EXTS)
             return ok({"files": files})
         except Exception as e:
             return err(f"Ошибка списка фото: {e}", 500)
@@ -1019,8 +1289,10 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
     @bp.route("/files/videos", methods=["GET"])
     def files_videos():
         try:
-            files = _collect_files(
-                VIDEOS_DIR, (".mp4", ".avi", ".mov", ".mkv"))
+            # пока идёт запись, размер файла растёт без смены mtime каталога
+            recording = bool(camera and camera.status.is_recording)
+            files = _cached_files(
+                VIDEOS_DIR, VIDEO_EXTS, volatile=recording)
             return ok({"files": files})
         except Exception as e:
             return err(f"Ошибка списка видео: {e}", 500)
@@ -1033,17 +1305,16 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
             return err("Не указан filepath", 400)
 
         try:
-            target = Path(filepath).resolve()
-            photos_root = Path(CAMERA_SAVE_PATH).resolve()
-            videos_root = Path(CAMERA_VIDEO_PATH).resolve()
+            # realpath цели обязателен: симлинк не должен увести наружу
+            target = os.path.realpath(filepath)
 
             # защита: удаляем только из наших директорий
-            if not (str(target).startswith(str(photos_root)) or str(target).startswith(str(videos_root))):
+            if not target.startswith(DELETE_ROOTS):
                 return err("Недопустимый путь", 400)
 
-            if target.exists() and target.is_file():
-                target.unlink()
-                return ok({"deleted": str(target.name)})
+            if os.path.isfile(target):
+                os.remove(target)
+                return ok({"deleted": os.path.basename(target)})
             else:
                 return err("Файл не найден", 404)
         except Exception as e:
@@ -1053,11 +1324,12 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
 
     @bp.route("/status", methods=["GET"])
     def status():
-        robot_status = robot.get_status()
+        robot_status = _status_snapshot(_robot_status_cache, robot.get_status)
 
         # Добавляем статус камеры если доступна
         if camera:
-            robot_status["camera"] = camera.get_status()
+            robot_status["camera"] = _status_snapshot(
+                _camera_status_cache, camera.get_status)
         else:
             robot_status["camera"] = {"available": False, "connected": False}
 
@@ -1073,13 +1345,15 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
 
     @bp.route("/health", methods=["GET"])
     def health():
-        status = robot.get_status()
+        status = _status_snapshot(_robot_status_cache, robot.get_status)
 
         status.update({
             "i2c_connected": robot.bus is not None,
             "controller_active": True,
             "camera_available": camera is not None,
             "camera_connected": camera.status.is_connected if camera else False,
+            "ai_enabled": ai_runtime is not None,
+            "ai_loaded": ai_runtime is not None and ai_runtime.is_loaded,
             "api_version": "2.1"
         })
         return ok(status)
@@ -1103,7 +1377,8 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
             ai_bp = create_ai_blueprint(
                 robot_controller=robot,
                 camera=camera,
-                ai_detector=ai_detector
+                ai_detector=ai_detector,
+                ai_runtime=ai_runtime
             )
 
             # Регистрируем AI API blueprint
@@ -1112,7 +1387,7 @@ def create_app(controller: RobotController | None = None, camera_instance: USBCa
             logger.info("✅ AI API успешно интегрировано")
 
         except Exception as e:
-            logger.error(f"❌ Ошибка интеграции AI API: {e}")
+            logger.error("❌ Ошибка интеграции AI API: %s", e)
     else:
         logger.info("ℹ️ AI API пропущено - модули недоступны")
 
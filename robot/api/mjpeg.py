@@ -0,0 +1,123 @@
+# robot/api/mjpeg.py
+"""
+Общие части MJPEG-стримов (multipart/x-mixed-replace; boundary=frame)
+"""
+
+import base64
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Заглушка - черный квадрат в JPEG (декодируется один раз при импорте)
+BLACK_JPEG_B64 = '/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQH/2wBDAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQH/wAARCAABAAEDASIAAhEBAxEB/8QAFQABAQAAAAAAAAAAAAAAAAAAAAv/xAAUEAEAAAAAAAAAAAAAAAAAAAAA/8QAFQEBAQAAAAAAAAAAAAAAAAAAAAX/xAAUEQEAAAAAAAAAAAAAAAAAAAAA/9oADAMBAAIRAxEAPwA/gA=='
+BLACK_JPEG = base64.b64decode(BLACK_JPEG_B64)
+
+# Заголовок части собирается из констант, меняется только длина кадра
+BOUNDARY_PREFIX = b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+BOUNDARY_MID = b"\r\n\r\n"
+BOUNDARY_SUFFIX = b"\r\n"
+
+
+def mjpeg_part(frame_data) -> bytes:
+    """Часть multipart-ответа с JPEG кадром одним bytes-объектом"""
+    return b"".join((BOUNDARY_PREFIX, b"%d" % len(frame_data),
+                     BOUNDARY_MID, frame_data, BOUNDARY_SUFFIX))
+
+
+# Готовая часть с заглушкой: отдаётся как есть, без сборки
+BLACK_PART = mjpeg_part(BLACK_JPEG)
+
+
+class FrameBroadcast:
+    """
+    Один продюсер кадров на всех подписчиков стрима.
+
+    produce() вызывается в фоновом потоке раз в interval секунд и
+    возвращает (JPEG bytes-like, meta) или None, если публиковать нечего.
+    Поток работает, пока есть подписчики (стримы) или не истекла аренда
+    (lease) от опрашивающих эндпоинтов.
+    """
+
+    def __init__(self, produce: Callable[[], Optional[Tuple[bytes, Any]]], interval: float, name: str = "mjpeg"):
+        self._produce = produce
+        self._interval = interval
+        self._name = name
+        self._cv = threading.Condition()
+        self._data: Optional[bytes] = None
+        self._meta: Any = None
+        self._seq = 0
+        self._subscribers = 0
+        self._lease_until = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> bool:
+        """Есть ли подписчики (или ещё работает продюсер)"""
+        with self._cv:
+            return self._subscribers > 0 or self._thread is not None
+
+    def publish(self, data: bytes, meta: Any = None):
+        with self._cv:
+            self._data = data
+            self._meta = meta
+            self._seq += 1
+            self._cv.notify_all()
+
+    def latest(self) -> Tuple[int, Optional[bytes], Any]:
+        """Последний опубликованный кадр без ожидания: (seq, data, meta)"""
+        with self._cv:
+            return self._seq, self._data, self._meta
+
+    def wait_for_new(self, last_seq: int, timeout: float) -> Tuple[int, Optional[bytes]]:
+        """Ждёт кадр новее last_seq (не дольше timeout), возвращает (seq, data)"""
+        with self._cv:
+            self._cv.wait_for(lambda: self._seq != last_seq, timeout)
+            return self._seq, self._data
+
+    def subscribe(self):
+        with self._cv:
+            self._subscribers += 1
+            self._ensure_thread()
+
+    def lease(self, seconds: float):
+        """Держать продюсер живым ещё seconds секунд (для поллинга без стрима)"""
+        with self._cv:
+            self._lease_until = max(
+                self._lease_until, time.monotonic() + seconds)
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._loop, name=self._name, daemon=True)
+            self._thread.start()
+
+    def unsubscribe(self):
+        with self._cv:
+            self._subscribers -= 1
+
+    def _loop(self):
+        logger.info("Запущен продюсер %s", self._name)
+        period = self._interval
+        next_deadline = time.monotonic() + period
+        while True:
+            with self._cv:
+                if self._subscribers <= 0 and time.monotonic() >= self._lease_until:
+                    self._thread = None
+                    break
+            try:
+                produced = self._produce()
+                if produced is not None:
+                    self.publish(*produced)
+            except Exception as e:
+                logger.error("Ошибка продюсера %s: %s", self._name, e)
+            # Темп по дедлайну: спим только остаток периода (время на
+            # produce() входит в период); при отставании не догоняем
+            now = time.monotonic()
+            if now < next_deadline:
+                time.sleep(next_deadline - now)
+            next_deadline = max(next_deadline + period, time.monotonic())
+        logger.info("Продюсер %s остановлен", self._name)
@@ -1,19 +1,28 @@
 # config.py
 
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from importlib.util import find_spec
 from pathlib import Path
+from types import MappingProxyType
+from typing import Final, Optional, TypedDict
 
-PROJECT_ROOT = Path(__file__).resolve().parent.parent
+logger = logging.getLogger(__name__)
+
+# без resolve(): __file__ импортированного модуля уже абсолютный, а realpath
+# делает lstat на каждый компонент пути при каждом старте
+PROJECT_ROOT = Path(__file__).parent.parent
 
 STATIC_DIR = PROJECT_ROOT / "static"
 TEMPLATES_DIR = PROJECT_ROOT / "templates"
 
 HOME_DIR = Path.home()
 # ==================== I2C НАСТРОЙКИ ====================
-I2C_AVAILABLE = True
-try:
-    import smbus2  # noqa: F401
-except ImportError:
-    I2C_AVAILABLE = False
+# Только проверка наличия модуля — сам smbus2 импортирует i2c_bus
+I2C_AVAILABLE = find_spec("smbus2") is not None
 
 I2C_BUS = 1
 ARDUINO_ADDRESS = 0x08
@@ -128,30 +137,50 @@ CAMERA_STEP_SIZE = 10
 # Если False — камера инициализируется при старте Flask-приложения.
 LIGHT_INIT = False
 
+# AI (YOLO-детектор и фоновая инференс-петля) создаётся лениво при первом
+# обращении; ROBOT_ENABLE_AI=0 отключает его полностью
+ENABLE_AI = os.getenv("ROBOT_ENABLE_AI", "1") == "1"
+
 # ==================== КАМЕРА ====================
 
-# Проверка доступности OpenCV
-CAMERA_AVAILABLE = True
-try:
-    import cv2  # noqa: F401
-except ImportError:
-    CAMERA_AVAILABLE = False
+# Проверка доступности OpenCV без загрузки cv2 (десятки МБ .so) — сам
+# модуль грузится при первом реальном использовании, см. _cv2()
+CAMERA_AVAILABLE = find_spec("cv2") is not None
+
+
+@lru_cache(maxsize=1)
+def _cv2():
+    import cv2
+    return cv2
 
-# Основные настройки камеры
-CAMERA_DEVICE_ID = 0  # /dev/video0
-CAMERA_WIDTH = 1280
-CAMERA_HEIGHT = 720
-CAMERA_FPS = 30
+# Основные настройки камеры (Final: не меняются в рантайме — линтер/mypy
+# ловят переприсваивание, mypyc может подставить значения как константы)
+CAMERA_DEVICE_ID: Final[int] = 0  # /dev/video0
+CAMERA_WIDTH: Final[int] = 1280
+CAMERA_HEIGHT: Final[int] = 720
+CAMERA_FPS: Final[int] = 30
 
 # Качество изображения
-CAMERA_QUALITY = 100  # JPEG качество (1-100)
-CAMERA_STREAM_QUALITY = 100  # Для веб-стрима
-CAMERA_STREAM_FPS = 30  # FPS веб-стрима
+CAMERA_QUALITY: Final[int] = 100  # JPEG качество (1-100)
+CAMERA_STREAM_QUALITY: Final[int] = 100  # Для веб-стрима
+CAMERA_STREAM_FPS: Final[int] = 30  # FPS веб-стрима
+# Отдавать в веб-стрим JPEG прямо с камеры (MJPG, без декодирования и
+# перекодирования). Разрешение и качество стрима — как у камеры,
+# CAMERA_STREAM_QUALITY не применяется. True/False — включить/выключить;
+# None — авто: при ширине кадра до 640 (resize не нужен), цветном стриме и
+# качестве стрима по умолчанию
+CAMERA_STREAM_PASSTHROUGH: Final[Optional[bool]] = None
+# Закрепить потоки камеры за ядрами (захват — 1, resize стрима — 2,
+# JPEG-кодирование — 3). Для 4-ядерных SBC; ядра, которых нет, пропускаются
+CAMERA_PIN_CORES: Final[bool] = False
+# Веб-стрим в оттенках серого (втрое меньше работы энкодеру и трафика
+# на цвет); отключает автоматический passthrough
+CAMERA_STREAM_GRAYSCALE: Final[bool] = False
 
 # Настройки изображения
-CAMERA_BRIGHTNESS = 40  # 0-100
-CAMERA_CONTRAST = 60      # 0-100
-CAMERA_SATURATION = 55  # 0-100
+CAMERA_BRIGHTNESS: Final[int] = 40  # 0-100
+CAMERA_CONTRAST: Final[int] = 60      # 0-100
+CAMERA_SATURATION: Final[int] = 55  # 0-100
 
 # Пути сохранения
 CAMERA_SAVE_PATH = str(STATIC_DIR / "photos")
@@ -172,6 +201,8 @@ MAX_VIDEOS = 20
 AUTO_CLEANUP_DAYS = 7
 
 # ==================== БЕЗОПАСНОСТЬ ====================
+# С ключом /api/* требует заголовок X-API-Key или cookie сессии, которую
+# веб-интерфейс получает через POST /api/login (ключ спрашивает у пользователя)
 API_KEY = None  # если None, аутентификация выключена
 
 # ==================== ЛОГИРОВАНИЕ ====================
@@ -212,9 +243,9 @@ OVERLAY_ROBOT_STATUS = False
 # ==================== ВАЛИДАЦИЯ НАСТРОЕК ====================
 
 
-def validate_camera_config():
-    """Проверка корректности настроек камеры"""
-    errors = []
+def validate_camera_config() -> list[str]:
+    """Проверка корректности настроек камеры (без побочных эффектов)"""
+    errors: list[str] = []
 
     # Проверка размеров
     if CAMERA_WIDTH <= 0 or CAMERA_HEIGHT <= 0:
@@ -233,16 +264,17 @@ def validate_camera_config():
     if CAMERA_STREAM_FPS <= 0 or CAMERA_STREAM_FPS > 30:
         errors.append("FPS стрима должен быть от 1 до 30")
 
-    # Проверка путей
-    try:
-        import pathlib
-        pathlib.Path(CAMERA_SAVE_PATH).mkdir(parents=True, exist_ok=True)
-        pathlib.Path(CAMERA_VIDEO_PATH).mkdir(parents=True, exist_ok=True)
-    except Exception as e:
-        errors.append(f"Ошибка создания директорий: {e}")
-
     return errors
 
+
+def ensure_camera_dirs(*paths: str | os.PathLike[str]) -> None:
+    """
+    Создать каталоги фото/видео (по умолчанию из конфига). Не при импорте
+    конфига, а при запуске камеры — импорт не трогает файловую систему
+    """
+    for path in paths or (CAMERA_SAVE_PATH, CAMERA_VIDEO_PATH):
+        os.makedirs(path, exist_ok=True)
+
 # ==================== ИНТЕГРАЦИЯ С РОБОТОМ ====================
 
 
@@ -259,33 +291,95 @@ SAVE_FRAME_ON_EMERGENCY = True
 
 # Проверка доступности USB камер
 
+# Результат пробы камер живёт USB_CAMERAS_TTL секунд; после этого вызов
+# сразу получает прежний список, а свежий собирается в фоне
+USB_CAMERAS_TTL = 30.0
 
-def check_usb_cameras():
-    """Проверка доступных USB камер"""
+
+class _UsbCamerasCache(TypedDict):
+    value: Optional[list[int]]  # None — ещё не пробовали
+    ts: float  # monotonic последней пробы
+    refreshing: bool  # фоновая проба уже идёт
+
+
+_usb_cameras_cache: _UsbCamerasCache = {
+    "value": None, "ts": 0.0, "refreshing": False}
+_usb_cameras_lock = threading.Lock()
+
+
+def _refresh_usb_cameras() -> list[int]:
+    value = _probe_usb_cameras()
+    with _usb_cameras_lock:
+        _usb_cameras_cache.update(
+            {"value": value, "ts": time.monotonic(), "refreshing": False})
+    return value
+
+
+def check_usb_cameras() -> list[int]:
+    """Проверка доступных USB камер (кэш на USB_CAMERAS_TTL сек)"""
     if not CAMERA_AVAILABLE:
         return []
 
+    with _usb_cameras_lock:
+        value = _usb_cameras_cache["value"]
+        if value is not None:
+            stale = time.monotonic() - _usb_cameras_cache["ts"] >= USB_CAMERAS_TTL
+            if stale and not _usb_cameras_cache["refreshing"]:
+                _usb_cameras_cache["refreshing"] = True
+                threading.Thread(target=_refresh_usb_cameras, daemon=True).start()
+            return list(value)
+
+    # первый вызов — синхронно
+    return list(_refresh_usb_cameras())
+
+
+def _video_indices() -> list[int]:
+    """
+    Номера /dev/videoN, умеющих захват (VIDIOC_QUERYCAP), — открываем только
+    их: узлы кодеков/ISP и метаданных UVC пропускаются без открытия потока
+    """
+    from robot.devices.v4l2 import v4l2_capture_devices
+    indices = v4l2_capture_devices()
+    return list(range(5)) if indices is None else indices
+
+
+def _probe_one(i: int) -> Optional[int]:
+    """Открыть /dev/videoN и прочитать кадр: i, если камера отдаёт кадры"""
+    cv2 = _cv2()
+    cap = cv2.VideoCapture(i, cv2.CAP_V4L2)
+    try:
+        if cap.isOpened():
+            ret, _ = cap.read()
+            if ret:
+                return i
+        return None
+    finally:
+        cap.release()
+
+
+def _probe_usb_cameras() -> list[int]:
+    """Проба USB камер: открыть и прочитать кадр"""
+    from concurrent.futures import ThreadPoolExecutor
     try:
-        import cv2
-        available_cameras = []
-
-        # Проверяем первые 5 устройств
-        for i in range(5):
-            cap = cv2.VideoCapture(i)
-            if cap.isOpened():
-                ret, _ = cap.read()
-                if ret:
-                    available_cameras.append(i)
-            cap.release()
-
-        return available_cameras
+        # Только реально существующие узлы, сразу через V4L2 — без
+        # перебора бэкендов OpenCV на каждом отсутствующем номере
+        indices = _video_indices()
+        if not indices:
+            return []
+
+        # Пробуем параллельно: open/read ждут согласования V4L2 в ядре
+        # (100–300 мс на узел), OpenCV на это время отпускает GIL
+        with ThreadPoolExecutor(max_workers=len(indices)) as ex:
+            results = list(ex.map(_probe_one, indices))
+
+        return [i for i in results if i is not None]
     except Exception:
         return []
 
 # Получение информации о системе
 
 
-def get_system_info():
+def get_system_info() -> dict:
     """Получение информации о системе для диагностики"""
     info = {
         "opencv_available": CAMERA_AVAILABLE,
@@ -296,8 +390,7 @@ def get_system_info():
 
     if CAMERA_AVAILABLE:
         try:
-            import cv2
-            info["opencv_version"] = cv2.__version__
+            info["opencv_version"] = _cv2().__version__
         except Exception:
             info["opencv_version"] = "unknown"
 
@@ -306,58 +399,60 @@ def get_system_info():
 # ==================== ЭКСПОРТ НАСТРОЕК ====================
 
 
-# Все настройки камеры в одном словаре для удобства
-CAMERA_CONFIG = {
-    "device_id": CAMERA_DEVICE_ID,
-    "width": CAMERA_WIDTH,
-    "height": CAMERA_HEIGHT,
-    "fps": CAMERA_FPS,
-    "quality": CAMERA_QUALITY,
-    "stream_quality": CAMERA_STREAM_QUALITY,
-    "stream_fps": CAMERA_STREAM_FPS,
-    "brightness": CAMERA_BRIGHTNESS,
-    "contrast": CAMERA_CONTRAST,
-    "saturation": CAMERA_SATURATION,
-    "save_path": CAMERA_SAVE_PATH,
-    "video_path": CAMERA_VIDEO_PATH,
-    "auto_start": CAMERA_AUTO_START,
-    "max_photo_size": MAX_PHOTO_SIZE,
-    "max_video_size": MAX_VIDEO_SIZE,
-    "max_photos": MAX_PHOTOS,
-    "max_videos": MAX_VIDEOS,
-    "auto_cleanup_days": AUTO_CLEANUP_DAYS,
-    "buffer_size": VIDEO_BUFFER_SIZE,
-    "init_timeout": CAMERA_INIT_TIMEOUT,
-    "capture_timeout": CAMERA_CAPTURE_TIMEOUT,
-    "threads": CAMERA_THREADS,
-    "motion_detection": ENABLE_MOTION_DETECTION,
-    "motion_threshold": MOTION_THRESHOLD,
-    "auto_record_on_motion": AUTO_RECORD_ON_MOTION,
-    "auto_record_duration": AUTO_RECORD_DURATION,
-    "video_overlay": ENABLE_VIDEO_OVERLAY,
-    "overlay_timestamp": OVERLAY_TIMESTAMP,
-    "overlay_robot_status": OVERLAY_ROBOT_STATUS,
-    "record_on_robot_move": RECORD_ON_ROBOT_MOVE,
-    "photo_on_obstacle": PHOTO_ON_OBSTACLE,
-    "save_frame_on_emergency": SAVE_FRAME_ON_EMERGENCY
-}
+# Все настройки камеры в одном словаре для удобства: ключ -> имя константы.
+# Словарь только для чтения: общий на всё приложение, копии не нужны
+_CAMERA_KEY_MAP = (
+    ("device_id", "CAMERA_DEVICE_ID"),
+    ("width", "CAMERA_WIDTH"),
+    ("height", "CAMERA_HEIGHT"),
+    ("fps", "CAMERA_FPS"),
+    ("quality", "CAMERA_QUALITY"),
+    ("stream_quality", "CAMERA_STREAM_QUALITY"),
+    ("stream_fps", "CAMERA_STREAM_FPS"),
+    ("stream_passthrough", "CAMERA_STREAM_PASSTHROUGH"),
+    ("pin_cores", "CAMERA_PIN_CORES"),
+    ("stream_grayscale", "CAMERA_STREAM_GRAYSCALE"),
+    ("brightness", "CAMERA_BRIGHTNESS"),
+    ("contrast", "CAMERA_CONTRAST"),
+    ("saturation", "CAMERA_SATURATION"),
+    ("save_path", "CAMERA_SAVE_PATH"),
+    ("video_path", "CAMERA_VIDEO_PATH"),
+    ("auto_start", "CAMERA_AUTO_START"),
+    ("max_photo_size", "MAX_PHOTO_SIZE"),
+    ("max_video_size", "MAX_VIDEO_SIZE"),
+    ("max_photos", "MAX_PHOTOS"),
+    ("max_videos", "MAX_VIDEOS"),
+    ("auto_cleanup_days", "AUTO_CLEANUP_DAYS"),
+    ("buffer_size", "VIDEO_BUFFER_SIZE"),
+    ("init_timeout", "CAMERA_INIT_TIMEOUT"),
+    ("capture_timeout", "CAMERA_CAPTURE_TIMEOUT"),
+    ("threads", "CAMERA_THREADS"),
+    ("motion_detection", "ENABLE_MOTION_DETECTION"),
+    ("motion_threshold", "MOTION_THRESHOLD"),
+    ("auto_record_on_motion", "AUTO_RECORD_ON_MOTION"),
+    ("auto_record_duration", "AUTO_RECORD_DURATION"),
+    ("video_overlay", "ENABLE_VIDEO_OVERLAY"),
+    ("overlay_timestamp", "OVERLAY_TIMESTAMP"),
+    ("overlay_robot_status", "OVERLAY_ROBOT_STATUS"),
+    ("record_on_robot_move", "RECORD_ON_ROBOT_MOVE"),
+    ("photo_on_obstacle", "PHOTO_ON_OBSTACLE"),
+    ("save_frame_on_emergency", "SAVE_FRAME_ON_EMERGENCY"),
+)
+CAMERA_CONFIG = MappingProxyType(
+    {key: globals()[name] for key, name in _CAMERA_KEY_MAP})
 
 
 # ==================== ОТЛАДКА ====================
 
 
 if ENABLE_CAMERA_DEBUG:
-    import logging
     logging.getLogger('robot.camera').setLevel(logging.DEBUG)
     print("🎥 Camera debug mode enabled")
 
-# Проверка конфигурации при импорте
-_config_errors = validate_camera_config()
-if _config_errors:
-    import logging
-    logger = logging.getLogger(__name__)
-    for error in _config_errors:
-        logger.warning(f"Camera config warning: {error}")
+# Проверка конфигурации при импорте (python -O выкидывает блок целиком)
+if __debug__:
+    for _error in validate_camera_config():
+        logger.warning("Camera config warning: %s", _error)
 
 # Вывод информации о системе при импорте (только в DEBUG режиме)
 if ENABLE_CAMERA_DEBUG:
@@ -1,20 +1,29 @@
 # robot/camera.py
 
 from __future__ import annotations
+import queue
 import threading
 import time
 import logging
 import base64
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple, Callable
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
 from robot import config as C
+from robot.devices.v4l2 import v4l2_capture_devices
+from robot.jpeg_codec import (JPEGLI_AVAILABLE, TURBOJPEG_AVAILABLE, decode_jpeg,
+                               encode_jpeg, write_jpeg_jpegli)
 
 logger = logging.getLogger(__name__)
 
 # Проверяем доступность OpenCV
 try:
     import cv2
+    import numpy as np
     OPENCV_AVAILABLE = True
     logger.info("OpenCV доступен")
 except ImportError:
@@ -22,6 +31,122 @@ except ImportError:
     logger.warning("OpenCV недоступен - камера будет недоступна")
 
 
+def _opencv_build_value(key: str) -> str:
+    """Значение строки key из cv2.getBuildInformation()"""
+    if not OPENCV_AVAILABLE:
+        return "unavailable"
+    for line in cv2.getBuildInformation().splitlines():
+        name, _, value = line.strip().partition(":")
+        if name == key:
+            return value.strip()
+    return "unknown"
+
+
+def opencv_jpeg_backend() -> str:
+    """Строка JPEG из cv2.getBuildInformation(), например 'libjpeg-turbo (ver 2.1.3-62)'"""
+    return _opencv_build_value("JPEG")
+
+
+# Аппаратные H.264 энкодеры GStreamer в порядке предпочтения:
+# Raspberry Pi (V4L2 M2M), Intel/AMD (VAAPI), Jetson (NVENC)
+_GST_H264_ENCODERS = (
+    "v4l2h264enc ! video/x-h264,level=(string)4",
+    "vaapih264enc",
+    "nvvidconv ! nvv4l2h264enc",
+)
+
+
+def _open_video_writer(filepath: str, fps: float, size: Tuple[int, int]):
+    """VideoWriter с аппаратным H.264 через GStreamer, иначе программный mp4v"""
+    if filepath.lower().endswith(".mp4") and _opencv_build_value("GStreamer").startswith("YES"):
+        for encoder in _GST_H264_ENCODERS:
+            pipeline = (f"appsrc ! videoconvert ! {encoder} ! h264parse ! "
+                        f'mp4mux ! filesink location="{filepath}"')
+            writer = cv2.VideoWriter(pipeline, cv2.CAP_GSTREAMER, 0, fps, size)
+            if writer.isOpened():
+                logger.info(f"Запись видео: аппаратный энкодер {encoder.split()[-1]}")
+                return writer
+            writer.release()
+        logger.info("Аппаратный H.264 недоступен — запись через mp4v")
+    return cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+
+
+# Ядра для потоков камеры при pin_cores: на 4-ядерном SBC ядро 0
+# остаётся системе и Flask; захват, resize стрима и JPEG-кодирование — каждый
+# на своём ядре, чтобы resize кадра N шёл параллельно с кодированием N-1.
+# Watchdog (спит) и запись не закрепляются — их раскидывает планировщик.
+# Ядра, которого нет (2-ядерная плата), поток просто не закрепляется
+_CORE_PLAN = {"capture": 1, "stream": 2, "encode": 3}
+
+
+def _pin_current_thread(role: str):
+    """Закрепить текущий поток за ядром из _CORE_PLAN (только Linux)"""
+    core = _CORE_PLAN[role]
+    try:
+        # маска главного потока — все ядра процесса; pid 0 — вызывающий
+        # поток (в Linux у каждого потока своя маска)
+        available = os.sched_getaffinity(os.getpid())
+        if core in available:
+            os.sched_setaffinity(0, {core})
+            logger.info(f"Поток камеры '{role}' закреплён за ядром {core}")
+        else:
+            # ядра нет: снимаем маску, унаследованную от закреплённого
+            # родителя (пул кодирования стартует из потока стрима)
+            os.sched_setaffinity(0, available)
+    except (AttributeError, OSError) as e:
+        logger.debug(f"Не удалось закрепить поток '{role}' за ядром {core}: {e}")
+
+
+# Во что колбэк хочет получать кадр: BGR, оттенки серого или JPEG (bytes-like)
+CALLBACK_FORMATS = ("bgr", "gray", "jpeg")
+
+
+class _FrameCallbackWorker:
+    """
+    Колбэк кадров в своём потоке: очередь на один кадр, новый кадр
+    вытесняет необработанный — медленный колбэк не тормозит захват
+    """
+
+    def __init__(self, callback: Callable, expects: str = "bgr"):
+        self.callback = callback
+        self.expects = expects
+        self._queue: queue.Queue = queue.Queue(maxsize=1)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True,
+            name=f"camera-cb-{getattr(callback, '__name__', 'callback')}")
+        self._thread.start()
+
+    def submit(self, frame):
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(frame)
+            except queue.Full:
+                pass
+
+    def stop(self, timeout: float = 1.0):
+        self._stopped.set()
+        self.submit(None)  # разбудить поток
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None or self._stopped.is_set():
+                return
+            try:
+                self.callback(frame)
+            except Exception as e:
+                logger.error(f"Ошибка в колбэке обработки кадра: {e}")
+
+
 @dataclass
 class CameraConfig:
     """Конфигурация камеры"""
@@ -42,6 +167,10 @@ class CameraConfig:
     # Настройки стрима
     stream_quality: int = C.CAMERA_STREAM_QUALITY  # Качество для веб-стрима
     stream_fps: int = C.CAMERA_STREAM_FPS      # FPS для веб-стрима
+    # JPEG камеры в стрим как есть: True/False — явно, None — авто
+    stream_passthrough: Optional[bool] = C.CAMERA_STREAM_PASSTHROUGH
+    stream_grayscale: bool = C.CAMERA_STREAM_GRAYSCALE  # стрим в оттенках серого
+    pin_cores: bool = C.CAMERA_PIN_CORES  # закрепить потоки камеры за ядрами
 
 
 @dataclass
@@ -61,6 +190,15 @@ class CameraStatus:
 class USBCamera:
     """Управление USB камерой с поддержкой стрима, записи и фото"""
 
+    # Сколько секунд без get_frame_jpeg() считаем, что стрим никто не смотрит
+    STREAM_IDLE_TIMEOUT = 2.0
+    # Ширина кадра веб-стрима; кадры шире уменьшаются перед кодированием
+    STREAM_MAX_WIDTH = 640
+    # Насколько свежим должен быть JPEG стрима, чтобы сохранить его как фото
+    PHOTO_REUSE_MAX_AGE = 0.2
+    # Сколько кадров записи может ждать энкодер (~0.25 с при 30 FPS)
+    RECORD_QUEUE_SIZE = 8
+
     def __init__(self, config: CameraConfig = None):
         if not OPENCV_AVAILABLE:
             raise ImportError("OpenCV недоступен - установите python3-opencv")
@@ -77,21 +215,70 @@ class USBCamera:
         self._stream_thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
 
-        # Синхронизация
-        self._frame_lock = threading.RLock()
-        self._current_frame: Optional = None  # type: ignore
-        self._stream_frame: Optional[bytes] = None
+        # Синхронизация: лок только у состояния JPEG стрима (кадр, номер,
+        # кэши base64/декодирования). BGR-кадр и счётчики захвата пишет
+        # один поток захвата — им лок не нужен, захват и стрим не делят лок
+        self._stream_lock = threading.Lock()
+        # будит ждущих wait_for_frame() при каждом новом JPEG стрима
+        self._stream_cond = threading.Condition(self._stream_lock)
+        # Последний BGR-кадр: каждый retrieve() даёт новый массив, кадр
+        # read-only и после публикации не меняется — читатели берут ссылку
+        # без лока и копии (присваивание атрибута атомарно под GIL)
+        self._current_frame: Optional[np.ndarray] = None
+        # когда снят _current_frame (monotonic); пишется после самого кадра
+        self._current_frame_mono = 0.0
+        # Без зрителей, записи и колбэков захват не делает retrieve() —
+        # take_photo() просит свежий кадр флагом и ждёт его на _frame_cond
+        self._frame_wanted = False
+        self._frame_cond = threading.Condition()
+        # JPEG стрима: bytes (passthrough) или memoryview на буфер imencode
+        self._stream_frame: Optional[bytes | memoryview] = None
+        # номер JPEG стрима; base64 кэшируется под этот номер
+        self._stream_seq = 0
+        self._stream_mono = 0.0  # когда снят кадр JPEG стрима (monotonic)
+        self._stream_b64_seq = -1
+        self._stream_b64: Optional[str] = None
+        # passthrough: BGR декодируется из JPEG стрима только по требованию
+        # (запись, колбэки, фото) и не чаще раза на кадр
+        self._decoded_seq = -1
+        self._decoded_frame: Optional[np.ndarray] = None
+        # passthrough: retrieve() отдаёт сырой MJPG-кадр камеры (CONVERT_RGB=0)
+        self._passthrough = False
+        self._raw_buf = None
+        # когда последний раз забирали JPEG (monotonic): без зрителей не кодируем
+        self._last_stream_request = 0.0
 
         # Статистика
-        self._frame_times: list[float] = []
-        self._recording_start_time: float = 0.0
+        self._frame_times: deque[float] = deque(maxlen=30)  # последние 30 кадров
+        self._recording_start_time: float = 0.0  # monotonic
+        # время последнего кадра по monotonic (NTP не сдвигает); настенное
+        # status.last_frame_time выводится из него в get_status()
+        self._last_frame_mono = 0.0
+        # FPS, на который согласилась камера (может быть выше config.fps)
+        self._sensor_fps = 0.0
+        # Разрешение, на которое согласилась камера (UVC округляет запрос
+        # до ближайшего режима) — по нему считаются стрим и запись
+        self._frame_size = (self.config.width, self.config.height)
 
         # Колбэки
-        self._frame_callbacks: list[Callable] = []
+        # кортеж, заменяемый целиком (copy-on-write): захват читает его
+        # без лока, добавление/удаление не ломает идущую итерацию
+        self._frame_callbacks: tuple[_FrameCallbackWorker, ...] = ()
+        self._callbacks_lock = threading.Lock()  # только для писателей
 
         self._watchdog_thread: Optional[threading.Thread] = None
 
-        # Создаем директории
+        # Запись: захват кладёт кадры в кольцо, пишет отдельный поток —
+        # медленный энкодер не задерживает grab(); при переполнении
+        # теряются самые старые кадры, а не темп захвата
+        self._record_queue: deque = deque(maxlen=self.RECORD_QUEUE_SIZE)
+        self._record_wake = threading.Event()
+        self._record_stop = threading.Event()
+        self._record_thread: Optional[threading.Thread] = None
+
+        # Директории фото/видео: Path собираем один раз, не на каждый снимок
+        self._photo_dir = Path(self.config.save_path)
+        self._video_dir = Path(self.config.video_path)
         self._ensure_directories()
 
         if self.config.auto_start:
@@ -99,9 +286,9 @@ class USBCamera:
 
     def _ensure_directories(self):
         """Создание необходимых директорий"""
-        for path in [self.config.save_path, self.config.video_path]:
+        for path in (self._photo_dir, self._video_dir):
             try:
-                Path(path).mkdir(parents=True, exist_ok=True)
+                C.ensure_camera_dirs(path)
                 logger.info(f"Директория создана/проверена: {path}")
             except Exception as e:
                 logger.error(f"Ошибка создания директории {path}: {e}")
@@ -137,6 +324,27 @@ class USBCamera:
 
             logger.info(f"Получен тестовый кадр: {frame.shape}")
 
+            # Без libjpeg-turbo (SIMD) imencode/imwrite в разы медленнее —
+            # пишем бэкенд в лог, чтобы регрессию сборки было видно сразу
+            jpeg_backend = opencv_jpeg_backend()
+            if TURBOJPEG_AVAILABLE:
+                logger.info("JPEG: PyTurboJPEG (libjpeg-turbo SIMD)")
+            elif "turbo" in jpeg_backend.lower():
+                logger.info(f"JPEG бэкенд OpenCV: {jpeg_backend}")
+            else:
+                logger.warning(
+                    f"JPEG бэкенд OpenCV без libjpeg-turbo: {jpeg_backend}")
+
+            self._configure_stream()
+            # Потоки захвата, стрима и кодирования работают параллельно и без
+            # своего C-шима: обёртки cv2 (read/grab/retrieve, imencode,
+            # VideoWriter.write, resize) и TurboJPEG отпускают GIL на время
+            # C-вызова; под GIL остаётся только питоновая обвязка цикла
+            self._encode_pool = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="camera-jpeg",
+                initializer=_pin_current_thread if self.config.pin_cores else None,
+                initargs=("encode",) if self.config.pin_cores else ())
+
             # Запуск потоков
             self._stop_event.clear()
             self._capture_thread = threading.Thread(
@@ -168,10 +376,14 @@ class USBCamera:
             return False
 
     def _setup_camera(self):
+        # passthrough решается заново на каждый запуск: после рестарта камера
+        # может откатиться на YUYV, а старый флаг отдал бы сырые байты как JPEG
+        self._passthrough = False
         if not self._cap:
             return
 
         try:
+            self._cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
             # базовые параметры
             self._cap.set(cv2.CAP_PROP_FRAME_WIDTH,  self.config.width)
             self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.config.height)
@@ -188,6 +400,8 @@ class USBCamera:
                     self._cap.set(cv2.CAP_PROP_FOURCC,
                                   cv2.VideoWriter_fourcc(*'YUYV'))
                     time.sleep(0.1)
+                elif self._want_passthrough():
+                    self._enable_passthrough()
             except Exception as e:
                 logger.warning(f"FOURCC установка не удалась: {e}")
 
@@ -214,6 +428,9 @@ class USBCamera:
                 fw = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
                 fh = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
                 ff = self._cap.get(cv2.CAP_PROP_FPS)
+                self._sensor_fps = ff
+                if fw > 0 and fh > 0:
+                    self._frame_size = (fw, fh)
                 logger.info(
                     f"Камера: {fw}x{fh}@{ff:.1f} | B:{br} C:{ct} S:{st}")
             except Exception:
@@ -223,17 +440,107 @@ class USBCamera:
         except Exception as e:
             logger.error(f"Ошибка настройки камеры: {e}")
 
+    def _want_passthrough(self) -> bool:
+        """
+        stream_passthrough True/False — как задано; None — авто: кадр и так
+        размера стрима (resize не нужен), цветной и качество стрима не
+        задано отдельно — decode+imencode дали бы тот же JPEG
+        """
+        wanted = self.config.stream_passthrough
+        if wanted is not None:
+            return wanted
+        return (not self.config.stream_grayscale
+                and self.config.stream_quality == C.CAMERA_STREAM_QUALITY
+                and self._cap.get(cv2.CAP_PROP_FRAME_WIDTH) <= self.STREAM_MAX_WIDTH)
+
+    def _enable_passthrough(self):
+        """Просим у V4L2 сырые MJPG-кадры; проверяем, что пришёл именно JPEG"""
+        self._passthrough = False
+        try:
+            self._cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            ok, raw = self._cap.read()
+            if ok and raw is not None and raw.size > 2:
+                head = raw.reshape(-1)[:2]
+                if head[0] == 0xFF and head[1] == 0xD8:
+                    self._passthrough = True
+                    logger.info("Стрим: JPEG камеры без перекодирования; "
+                                "stream_quality и stream_grayscale не применяются")
+                    return
+            logger.warning("Камера не отдаёт сырой MJPG — стрим через imencode")
+        except Exception as e:
+            logger.warning(f"Passthrough MJPG недоступен: {e}")
+        self._cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+
+    def _configure_stream(self):
+        """
+        Параметры стрима из конфига — один раз на запуск, а не в каждой
+        итерации цикла. Вызывается из start() и set_stream_params()
+        """
+        # Буферов под resize два: пока пул кодирует один, в другой идёт resize
+        frame_width, frame_height = self._frame_size
+        stream_width = min(frame_width, self.STREAM_MAX_WIDTH)
+        stream_height = int(stream_width * frame_height / frame_width)
+        self._stream_size = (stream_width, stream_height)
+        self._resize_bufs = [
+            np.empty((stream_height, stream_width, 3), np.uint8)
+            for _ in range(2)]
+        # Серый стрим: 1 байт на пиксель вместо 3 — втрое меньше работы
+        # энкодеру; буферы тоже парные
+        self._gray_bufs = ([np.empty((stream_height, stream_width), np.uint8)
+                            for _ in range(2)]
+                           if self.config.stream_grayscale else None)
+        # encode_jpeg кодирует baseline без оптимизации Хаффмана —
+        # стриму скорость важнее пары процентов размера
+        self._stream_quality = self.config.stream_quality
+        self._stream_period = (1.0 / max(self.config.stream_fps, 5)
+                               if self.config.stream_fps > 0 else 0.066)
+
+    def set_stream_params(self, quality: int = None, fps: int = None):
+        """Изменить качество/FPS веб-стрима на лету"""
+        if quality is not None:
+            self.config.stream_quality = quality
+            if self._passthrough:
+                logger.warning(
+                    f"Стрим в passthrough (JPEG камеры) — качество {quality} не применяется")
+        if fps is not None:
+            self.config.stream_fps = fps
+        self._configure_stream()
+
     def _capture_loop(self):
         """Основной цикл захвата кадров"""
         logger.info("Запущен поток захвата кадров")
+        if self.config.pin_cores:
+            _pin_current_thread("capture")
         consecutive_errors = 0
         max_consecutive_errors = 10
+        # Декодируем (retrieve) не чаще темпа стрима, если кадр не нужен
+        # записи или колбэкам; остальные кадры только grab() из драйвера
+        last_retrieve = 0.0
+        # Горячий цикл (30+ Гц): атрибуты и глобалы — в локальные имена.
+        # deque меняется на месте, поэтому ссылка остаётся актуальной;
+        # кортеж колбэков заменяется целиком — его снимок берём на кадр
+        status = self.status
+        frame_times = self._frame_times
+        monotonic = time.monotonic
+        idle_timeout = self.STREAM_IDLE_TIMEOUT
+        # Темп задаёт V4L2: grab() блокируется до следующего кадра. Если
+        # камера проигнорировала CAP_PROP_FPS и шлёт чаще config.fps —
+        # прореживаем по абсолютному расписанию (без sleep и без дрейфа);
+        # grab() всё равно забирает каждый кадр, чтобы не копить старые
+        throttle = 0 < self.config.fps < self._sensor_fps * 0.9
+        frame_period = 1.0 / self.config.fps if throttle else 0.0
+        # допуск на джиттер доставки — полкадра сенсора
+        slack = 0.5 / self._sensor_fps if throttle else 0.0
+        next_due = 0.0
+        if throttle:
+            logger.info(
+                f"Камера отдаёт {self._sensor_fps:.1f} FPS — прореживаем до {self.config.fps}")
 
         while not self._stop_event.is_set() and self._cap and self._cap.isOpened():
             try:
-                ret, frame = self._cap.read()
+                ok = self._cap.grab()
 
-                if not ret or frame is None:
+                if not ok:
                     consecutive_errors += 1
                     logger.warning(
                         f"Не удалось получить кадр (ошибка {consecutive_errors}/{max_consecutive_errors})")
@@ -247,41 +554,79 @@ class USBCamera:
                     continue
 
                 consecutive_errors = 0  # Сброс счетчика при успешном кадре
-                current_time = time.time()
-
-                with self._frame_lock:
-                    self._current_frame = frame.copy()
-                    self.status.frame_count += 1
-                    self.status.last_frame_time = current_time
-
-                # Статистика FPS
-                self._frame_times.append(current_time)
-                if len(self._frame_times) > 30:  # Последние 30 кадров
-                    self._frame_times.pop(0)
+                current_time = monotonic()
 
-                if len(self._frame_times) > 1:
-                    fps = len(self._frame_times) / \
-                        (self._frame_times[-1] - self._frame_times[0])
-                    self.status.fps_actual = round(fps, 1)
+                # единственный писатель — поток захвата, лок не нужен
+                status.frame_count += 1
+                self._last_frame_mono = current_time
 
-                # Колбэки для обработки кадров
-                for callback in self._frame_callbacks:
-                    try:
-                        callback(frame)
-                    except Exception as e:
-                        logger.error(f"Ошибка в колбэке обработки кадра: {e}")
-
-                # Запись видео
-                if self.status.is_recording and self._writer:
-                    try:
-                        self._writer.write(frame)
-                        self.status.recording_duration = current_time - self._recording_start_time
-                    except Exception as e:
-                        logger.error(f"Ошибка записи кадра в видео: {e}")
-
-                # Контроль FPS
-                time.sleep(1.0 / max(self.config.fps, 5)
-                           if self.config.fps > 0 else 0.033)
+                if throttle:
+                    if current_time < next_due - slack:
+                        continue
+                    next_due = max(next_due + frame_period, current_time)
+
+                # Статистика FPS: только метка, сам FPS считает get_status()
+                frame_times.append(current_time)
+
+                callbacks = self._frame_callbacks
+
+                # в passthrough retrieve — лишь копия JPEG, берём его всегда:
+                # свежий кадр нужен и для take_photo
+                # _stream_wanted() инлайном: current_time уже есть, второй
+                # вызов monotonic() и метода на кадр не нужен
+                need_frame = (status.is_recording or callbacks or self._frame_wanted
+                              or (current_time - last_retrieve >= self._stream_period
+                                  and (self._passthrough
+                                       or current_time - self._last_stream_request <= idle_timeout)))
+                if need_frame:
+                    frame = None
+                    jpeg = None
+                    if self._passthrough:
+                        # JPEG камеры сразу в стрим; BGR — только записи/колбэкам
+                        ret, raw = self._cap.retrieve(self._raw_buf)
+                        if ret and raw is not None:
+                            last_retrieve = current_time
+                            self._raw_buf = raw
+                            # копия обязательна: _raw_buf переиспользуется retrieve()
+                            jpeg = raw.tobytes()
+                            self._publish_stream_frame(jpeg, current_time)
+                            if status.is_recording or callbacks:
+                                frame = self._decode_stream_frame()
+                    else:
+                        # без dst: свежий буфер, старый кадр читатели дочитают спокойно
+                        ret, frame = self._cap.retrieve()
+                        if ret and frame is not None:
+                            last_retrieve = current_time
+                        else:
+                            frame = None
+
+                    if frame is not None:
+                        frame.flags.writeable = False
+                        self._current_frame = frame
+                        self._current_frame_mono = current_time
+                        if self._frame_wanted:
+                            with self._frame_cond:
+                                self._frame_wanted = False
+                                self._frame_cond.notify_all()
+
+                        # Колбэки в своих потоках получают тот же неизменяемый
+                        # кадр — без копий, держать его можно сколько угодно.
+                        # Серый/JPEG считаются раз на кадр и общие для всех
+                        if callbacks:
+                            views = {"bgr": frame, "jpeg": jpeg}
+                            for worker in callbacks:
+                                data = views.get(worker.expects)
+                                if data is None:
+                                    data = views[worker.expects] = \
+                                        self._callback_view(frame, worker.expects)
+                                if data is not None:
+                                    worker.submit(data)
+
+                        # Запись видео — в поток записи
+                        if status.is_recording:
+                            self._record_queue.append(frame)
+                            self._record_wake.set()
+                            status.recording_duration = current_time - self._recording_start_time
 
             except Exception as e:
                 consecutive_errors += 1
@@ -295,43 +640,73 @@ class USBCamera:
     def _stream_loop(self):
         """Цикл подготовки кадров для веб-стрима"""
         logger.info("Запущен поток веб-стрима")
+        if self.config.pin_cores:
+            _pin_current_thread("stream")
+        # JPEG кодируется в пуле из одного потока: resize кадра N идёт
+        # параллельно с кодированием N-1, результат публикует колбэк пула
+        pool = self._encode_pool
+        pending = None
+        buf_idx = 0
 
         while not self._stop_event.is_set():
             try:
-                with self._frame_lock:
-                    if self._current_frame is None:
-                        time.sleep(0.1)
-                        continue
-
-                    frame = self._current_frame.copy()
-
-                # Изменяем размер для стрима (экономия трафика)
-                stream_width = min(self.config.width, 640)
-                stream_height = int(
-                    stream_width * self.config.height / self.config.width)
-
-                if frame.shape[1] != stream_width:
-                    frame = cv2.resize(frame, (stream_width, stream_height))
+                # Никто не забирает кадры — не кодируем впустую;
+                # в passthrough JPEG публикует поток захвата
+                if self._passthrough or not self._stream_wanted():
+                    time.sleep(0.2)
+                    continue
 
-                # Кодируем в JPEG для веб-стрима
-                encode_param = [cv2.IMWRITE_JPEG_QUALITY,
-                                self.config.stream_quality]
-                ret, buffer = cv2.imencode('.jpg', frame, encode_param)
+                # время съёмки читаем до кадра: захват пишет их в обратном
+                # порядке, так время не окажется новее кадра
+                captured = self._current_frame_mono
+                frame = self._current_frame
+                if frame is None:
+                    time.sleep(0.1)
+                    continue
 
-                if ret:
-                    with self._frame_lock:
-                        self._stream_frame = buffer.tobytes()
+                # Изменяем размер для стрима (экономия трафика) — в заранее
+                # выделенный буфер; INTER_AREA дешевле и чище при уменьшении
+                if frame.shape[1] != self._stream_size[0]:
+                    resized = self._resize_bufs[buf_idx]
+                    cv2.resize(frame, self._stream_size, dst=resized,
+                               interpolation=cv2.INTER_AREA)
+                    frame = resized
+                gray_bufs = self._gray_bufs
+                if gray_bufs is not None:
+                    gray = gray_bufs[buf_idx]
+                    cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+                    frame = gray
+                buf_idx ^= 1
+
+                # Не больше одного кадра в очереди пула: буфер предыдущего
+                # кадра освобождается только после его кодирования
+                if pending is not None:
+                    pending.result()
+
+                # Кодируем в JPEG для веб-стрима (TurboJPEG, если есть)
+                pending = pool.submit(encode_jpeg, frame, self._stream_quality)
+                pending.add_done_callback(partial(self._on_stream_encoded, captured))
 
                 # Ограничиваем FPS стрима
-                time.sleep(1.0 / max(self.config.stream_fps, 5)
-                           if self.config.stream_fps > 0 else 0.066)
+                time.sleep(self._stream_period)
 
             except Exception as e:
                 logger.error(f"Ошибка в потоке стрима: {e}")
                 time.sleep(1.0)
 
+        pool.shutdown(wait=True)
         logger.info("Поток веб-стрима завершен")
 
+    def _on_stream_encoded(self, captured: float, future):
+        """Колбэк пула кодирования: публикует готовый JPEG стрима"""
+        try:
+            jpeg = future.result()
+        except Exception as e:
+            logger.error(f"Ошибка кодирования кадра стрима: {e}")
+            return
+        if jpeg is not None:
+            self._publish_stream_frame(jpeg, captured)
+
     def _watchdog_loop(self):
         """Watchdog для мониторинга состояния камеры"""
         logger.info("Запущен watchdog камеры")
@@ -340,8 +715,8 @@ class USBCamera:
 
         while not self._stop_event.is_set():
             try:
-                now = time.time()
-                silent_for = now - self.status.last_frame_time if self.status.last_frame_time else 0
+                now = time.monotonic()
+                silent_for = now - self._last_frame_mono if self._last_frame_mono else 0
 
                 if self.status.is_connected and silent_for > 5.0:
                     if now - last_restart >= min_restart_interval:
@@ -357,42 +732,167 @@ class USBCamera:
 
         logger.info("Watchdog камеры завершен")
 
-    def get_frame_jpeg(self) -> Optional[bytes]:
-        """Получение текущего кадра в формате JPEG для веб-стрима"""
-        with self._frame_lock:
+    def _publish_stream_frame(self, jpeg: bytes | memoryview, captured: float):
+        with self._stream_cond:
+            self._stream_frame = jpeg
+            self._stream_seq += 1
+            self._stream_mono = captured
+            self._stream_cond.notify_all()
+
+    def wait_for_frame(self, last_seq: int,
+                       timeout: float = 1.0) -> Tuple[int, Optional[bytes | memoryview]]:
+        """
+        Ждать JPEG стрима новее last_seq (не дольше timeout).
+        Возвращает (seq, jpeg); seq == last_seq — нового кадра не было
+        """
+        self._last_stream_request = time.monotonic()
+        with self._stream_cond:
+            self._stream_cond.wait_for(
+                lambda: self._stream_seq != last_seq, timeout)
+            return self._stream_seq, self._stream_frame
+
+    def _stream_wanted(self) -> bool:
+        return time.monotonic() - self._last_stream_request <= self.STREAM_IDLE_TIMEOUT
+
+    def _request_stream_frame(self, timeout: float = 1.0):
+        """
+        Отметить запрос JPEG стрима. Если стрим простаивал, захват не делал
+        retrieve() и JPEG устарел — ждём кадр, снятый после запроса
+        """
+        now = time.monotonic()
+        idle = now - self._last_stream_request > self.STREAM_IDLE_TIMEOUT
+        self._last_stream_request = now
+        # passthrough публикует JPEG и без зрителей
+        if not idle or self._passthrough or not self.status.is_streaming:
+            return
+        with self._stream_cond:
+            self._stream_cond.wait_for(lambda: self._stream_mono >= now, timeout)
+
+    def _fresh_frame(self, timeout: float = 1.0) -> Optional[np.ndarray]:
+        """BGR-кадр не старше PHOTO_REUSE_MAX_AGE; если такого нет — просим захват"""
+        requested = time.monotonic()
+        if requested - self._current_frame_mono <= self.PHOTO_REUSE_MAX_AGE:
+            return self._current_frame
+        deadline = requested + timeout
+        with self._frame_cond:
+            # флаг ставим заново после каждого пробуждения: захват сбрасывает
+            # его на первом кадре, а он мог быть снят до нашего запроса
+            while self._current_frame_mono < requested:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("Нет свежего кадра — берём последний")
+                    break
+                self._frame_wanted = True
+                self._frame_cond.wait(remaining)
+        return self._current_frame
+
+    def get_frame_jpeg(self) -> Optional[bytes | memoryview]:
+        """Получение текущего кадра в формате JPEG (bytes-like) для веб-стрима"""
+        self._request_stream_frame()
+        with self._stream_lock:
             return self._stream_frame
 
     def get_frame_base64(self) -> Optional[str]:
-        """Получение текущего кадра в формате base64"""
-        jpeg_data = self.get_frame_jpeg()
-        if jpeg_data:
-            return base64.b64encode(jpeg_data).decode('utf-8')
-        return None
-
-    def take_photo(self, filename: str = None) -> Tuple[bool, str]:
-        """Сделать фотографию"""
+        """Получение текущего кадра в формате base64 (один раз на кадр)"""
+        self._request_stream_frame()
+        with self._stream_lock:
+            seq, jpeg_data = self._stream_seq, self._stream_frame
+            if self._stream_b64_seq == seq:
+                return self._stream_b64
+        if not jpeg_data:
+            return None
+        # кодируем вне лока: захват и стрим не ждут
+        b64 = base64.b64encode(jpeg_data).decode('utf-8')
+        with self._stream_lock:
+            if self._stream_seq == seq:
+                self._stream_b64_seq, self._stream_b64 = seq, b64
+        return b64
+
+    def _decode_stream_frame(self) -> Optional[np.ndarray]:
+        """Passthrough: BGR из текущего JPEG стрима, декодируется раз на кадр"""
+        with self._stream_lock:
+            seq, jpeg = self._stream_seq, self._stream_frame
+            if self._decoded_seq == seq:
+                return self._decoded_frame
+        frame = decode_jpeg(jpeg) if jpeg else None
+        if frame is None:
+            return None
+        frame.flags.writeable = False
+        with self._stream_lock:
+            if self._stream_seq == seq:
+                self._decoded_seq, self._decoded_frame = seq, frame
+        return frame
+
+    def _photo_from_stream_jpeg(self):
+        """
+        JPEG стрима, который можно сохранить как фото без перекодирования:
+        свежий, полного разрешения, цветной и того же качества (в passthrough
+        это исходный JPEG камеры). Иначе None
+        """
+        if not self._passthrough and (
+                self.config.quality != self.config.stream_quality
+                or self._stream_size != self._frame_size
+                or self.config.stream_grayscale):
+            return None
+        with self._stream_lock:
+            jpeg, captured = self._stream_frame, self._stream_mono
+        if jpeg is None or time.monotonic() - captured > self.PHOTO_REUSE_MAX_AGE:
+            return None
+        return jpeg
+
+    def take_photo(self, filename: str = None,
+                   high_efficiency: bool = True) -> Tuple[bool, str]:
+        """Сделать фотографию (high_efficiency — JPEG через jpegli, если есть)"""
         if not self.status.is_connected:
             return False, "Камера не подключена"
 
-        with self._frame_lock:
-            if self._current_frame is None:
-                return False, "Нет доступных кадров"
+        if filename is None:
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            filename = f"photo_{timestamp}.jpg"
 
-            frame = self._current_frame.copy()
+        if not filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            filename += '.jpg'
 
-        try:
-            if filename is None:
-                timestamp = time.strftime("%Y%m%d_%H%M%S")
-                filename = f"photo_{timestamp}.jpg"
-
-            if not filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                filename += '.jpg'
+        filepath = self._photo_dir / filename
+        is_jpeg = filepath.suffix.lower() in ('.jpg', '.jpeg')
 
-            filepath = Path(self.config.save_path) / filename
+        # Готовый JPEG стрима подходит — пишем его, без кодирования; jpegli
+        # (если просили и он есть) всё же перекодирует ради меньшего файла
+        stream_jpeg = None
+        if is_jpeg and not (high_efficiency and JPEGLI_AVAILABLE):
+            stream_jpeg = self._photo_from_stream_jpeg()
+        if stream_jpeg is not None:
+            try:
+                filepath.write_bytes(stream_jpeg)
+                logger.info(f"Фото сохранено (JPEG стрима): {filepath}")
+                return True, str(filepath)
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить JPEG стрима: {e}")
+
+        if self._passthrough:
+            # BGR-кадр обновляется только для записи/колбэков —
+            # берём свежий JPEG камеры (декодируется, если ещё не был)
+            frame = self._decode_stream_frame()
+        else:
+            # кадр неизменяем — копия не нужна; без зрителей стрима захват
+            # не обновляет его, поэтому берём свежий
+            frame = self._fresh_frame()
+        if frame is None:
+            return False, "Нет доступных кадров"
 
-            # Сохраняем с высоким качеством
-            encode_param = [cv2.IMWRITE_JPEG_QUALITY, self.config.quality]
-            success = cv2.imwrite(str(filepath), frame, encode_param)
+        try:
+            # Сохраняем с высоким качеством; jpegli даёт файл меньше при
+            # том же качестве, без него — JPEG через TurboJPEG, PNG — imwrite
+            success = (high_efficiency and is_jpeg
+                       and write_jpeg_jpegli(frame, filepath, self.config.quality))
+            if not success and is_jpeg:
+                jpeg = encode_jpeg(frame, self.config.quality)
+                if jpeg is not None:
+                    filepath.write_bytes(jpeg)
+                    success = True
+            if not success:
+                encode_param = [cv2.IMWRITE_JPEG_QUALITY, self.config.quality]
+                success = cv2.imwrite(str(filepath), frame, encode_param)
 
             if success:
                 logger.info(f"Фото сохранено: {filepath}")
@@ -421,24 +921,28 @@ class USBCamera:
             if not filename.lower().endswith(('.mp4', '.avi', '.mov')):
                 filename += '.mp4'
 
-            filepath = Path(self.config.video_path) / filename
-
-            # Настройка кодека
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            filepath = self._video_dir / filename
 
-            self._writer = cv2.VideoWriter(
+            # Аппаратный H.264 (если есть), иначе mp4v
+            self._writer = _open_video_writer(
                 str(filepath),
-                fourcc,
                 self.config.fps,
-                (self.config.width, self.config.height)
+                self._frame_size
             )
 
             if not self._writer.isOpened():
                 raise Exception("Не удалось инициализировать запись видео")
 
+            self._record_queue.clear()
+            self._record_stop = threading.Event()
+            self._record_thread = threading.Thread(
+                target=self._record_loop, args=(self._writer, self._record_stop),
+                daemon=True)
+            self._record_thread.start()
+
             self.status.is_recording = True
             self.status.recording_file = str(filepath)
-            self._recording_start_time = time.time()
+            self._recording_start_time = time.monotonic()
             self.status.recording_duration = 0.0
 
             logger.info(f"Начата запись видео: {filepath}")
@@ -467,14 +971,18 @@ class USBCamera:
             return False, "Запись не идет"
 
         try:
-            if self._writer:
-                self._writer.release()
-                self._writer = None
+            self.status.is_recording = False
+            # поток записи дописывает очередь и закрывает файл сам
+            self._record_stop.set()
+            self._record_wake.set()
+            if self._record_thread and self._record_thread is not threading.current_thread():
+                self._record_thread.join(timeout=5.0)
+            self._record_thread = None
+            self._writer = None
 
             filepath = self.status.recording_file
             duration = self.status.recording_duration
 
-            self.status.is_recording = False
             self.status.recording_file = ""
             self.status.recording_duration = 0.0
 
@@ -486,17 +994,78 @@ class USBCamera:
             logger.error(error_msg)
             return False, error_msg
 
-    def add_frame_callback(self, callback: Callable):
-        """Добавить колбэк для обработки каждого кадра"""
-        self._frame_callbacks.append(callback)
+    def _callback_view(self, frame: np.ndarray, kind: str):
+        """Кадр в формате kind для колбэков (один раз на кадр)"""
+        if kind == "gray":
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            gray.flags.writeable = False
+            return gray
+        if kind == "jpeg":
+            return encode_jpeg(frame, self.config.quality)
+        return frame
+
+    def _record_loop(self, writer, stop: threading.Event):
+        """Поток записи: пишет кадры из кольца, по stop дописывает и закрывает файл"""
+        queue_ = self._record_queue
+        try:
+            while True:
+                self._record_wake.wait(0.5)
+                self._record_wake.clear()
+                while queue_:
+                    try:
+                        frame = queue_.popleft()
+                    except IndexError:
+                        break
+                    try:
+                        writer.write(frame)
+                    except Exception as e:
+                        logger.error(f"Ошибка записи кадра в видео: {e}")
+                if stop.is_set():
+                    break
+        finally:
+            writer.release()
+
+    def add_frame_callback(self, callback: Callable, expects: str = "bgr"):
+        """
+        Добавить колбэк для обработки кадров.
+        Колбэк вызывается в своём потоке с последним кадром; если он не
+        успевает, промежуточные кадры пропускаются. Кадр read-only,
+        общий для всех колбэков; чтобы менять его — сделайте frame.copy().
+        expects: "bgr", "gray" или "jpeg" — конвертация делается один раз
+        на кадр для всех колбэков с тем же форматом
+        """
+        if expects not in CALLBACK_FORMATS:
+            raise ValueError(f"expects должен быть одним из {CALLBACK_FORMATS}")
+        worker = _FrameCallbackWorker(callback, expects)
+        with self._callbacks_lock:
+            self._frame_callbacks = self._frame_callbacks + (worker,)
 
     def remove_frame_callback(self, callback: Callable):
         """Удалить колбэк обработки кадров"""
-        if callback in self._frame_callbacks:
-            self._frame_callbacks.remove(callback)
+        with self._callbacks_lock:
+            removed = [w for w in self._frame_callbacks if w.callback == callback]
+            self._frame_callbacks = tuple(
+                w for w in self._frame_callbacks if w.callback != callback)
+        for worker in removed:
+            worker.stop()
+
+    def stream_encoder(self) -> str:
+        """Кто кодирует JPEG стрима: аппаратный MJPG камеры, TurboJPEG или OpenCV"""
+        if self._passthrough:
+            return "camera"
+        return "turbojpeg" if TURBOJPEG_AVAILABLE else "opencv"
 
     def get_status(self) -> dict:
         """Получить статус камеры"""
+        if self._last_frame_mono:
+            self.status.last_frame_time = time.time() - (time.monotonic() - self._last_frame_mono)
+        # FPS по требованию, а не на каждом кадре; снимок deque целиком —
+        # захват может дописать метку между чтениями [0] и [-1]
+        times = tuple(self._frame_times)
+        if len(times) > 1 and times[-1] > times[0]:
+            # n меток — это n-1 межкадровых интервалов
+            self.status.fps_actual = round(
+                (len(times) - 1) / (times[-1] - times[0]), 1)
         return {
             "connected": self.status.is_connected,
             "streaming": self.status.is_streaming,
@@ -507,6 +1076,7 @@ class USBCamera:
             "error": self.status.error_message,
             "recording_file": self.status.recording_file,
             "recording_duration": round(self.status.recording_duration, 1),
+            "stream_encoder": self.stream_encoder(),
             "config": {
                 "device_id": self.config.device_id,
                 "resolution": f"{self.config.width}x{self.config.height}",
@@ -590,6 +1160,11 @@ def create_camera(
 
 def list_available_cameras() -> list[int]:
     """Список доступных камер"""
+    available = v4l2_capture_devices()
+    if available is not None:
+        logger.info(f"Найдено камер: {available}")
+        return available
+
     if not OPENCV_AVAILABLE:
         logger.warning("OpenCV недоступен - невозможно проверить камеры")
         return []
@@ -0,0 +1,53 @@
+# robot/devices/v4l2.py
+"""
+Перечисление V4L2-камер без OpenCV: ioctl VIDIOC_QUERYCAP на /dev/videoN
+"""
+
+from __future__ import annotations
+import logging
+import os
+import struct
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# V4L2: VIDIOC_QUERYCAP = _IOR('V', 0, struct v4l2_capability[104])
+_VIDIOC_QUERYCAP = 0x80685600
+_V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+_V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+
+def v4l2_capture_devices() -> Optional[list[int]]:
+    """
+    Номера /dev/videoN, умеющих захват видео, — одним ioctl VIDIOC_QUERYCAP
+    на узел, без открытия потока и буферов. None — V4L2 недоступен
+    """
+    try:
+        import fcntl
+        entries = [e.name for e in os.scandir("/dev") if e.name.startswith("video")]
+    except (ImportError, OSError):
+        return None
+
+    found = []
+    for name in entries:
+        if not name[5:].isdigit():
+            continue
+        try:
+            fd = os.open(f"/dev/{name}", os.O_RDONLY | os.O_NONBLOCK)
+        except OSError as e:
+            logger.debug(f"Нет доступа к /dev/{name}: {e}")
+            continue
+        try:
+            buf = fcntl.ioctl(fd, _VIDIOC_QUERYCAP, bytes(104))
+        except OSError as e:
+            logger.debug(f"VIDIOC_QUERYCAP /dev/{name}: {e}")
+            continue
+        finally:
+            os.close(fd)
+        caps, device_caps = struct.unpack_from("=II", buf, 84)
+        # у UVC второй узел — метаданные: смотрим возможности именно узла
+        if caps & _V4L2_CAP_DEVICE_CAPS:
+            caps = device_caps
+        if caps & _V4L2_CAP_VIDEO_CAPTURE:
+            found.append(int(name[5:]))
+    return sorted(found)
@@ -0,0 +1,97 @@
+# robot/jpeg_codec.py
+"""
+Общее JPEG кодирование/декодирование: libjpeg-turbo (PyTurboJPEG), если
+есть, иначе OpenCV
+"""
+
+from __future__ import annotations
+import logging
+import shutil
+import subprocess
+import tempfile
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Без OpenCV/numpy модуль импортируется, а функции возвращают None/False —
+# камера сама решает по OPENCV_AVAILABLE, работать ли ей
+try:
+    import cv2
+    import numpy as np
+    OPENCV_AVAILABLE = True
+except ImportError:
+    cv2 = None
+    np = None
+    OPENCV_AVAILABLE = False
+
+# PyTurboJPEG — SIMD-путь libjpeg-turbo; OpenCV-сборки часто без него
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJPF_GRAY, TJSAMP_420, TJSAMP_GRAY
+    _TJ = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except Exception as e:  # нет модуля или libturbojpeg.so
+    _TJ = None
+    TURBOJPEG_AVAILABLE = False
+    logger.debug(f"PyTurboJPEG недоступен, JPEG через OpenCV: {e}")
+
+# cjpegli (libjxl) — перцептивное квантование: файл ~на 30% меньше
+# libjpeg-turbo при том же качестве; для фото, где скорость не важна
+_CJPEGLI = shutil.which("cjpegli")
+JPEGLI_AVAILABLE = _CJPEGLI is not None
+
+
+def encode_jpeg(img: np.ndarray, quality: int = 80):
+    """BGR- или серый (2D) кадр -> JPEG (bytes-like) или None при ошибке"""
+    if _TJ is not None:
+        try:
+            if img.ndim == 2:
+                return _TJ.encode(img[..., None], quality=quality,
+                                  pixel_format=TJPF_GRAY, jpeg_subsample=TJSAMP_GRAY)
+            return _TJ.encode(img, quality=quality,
+                              pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+        except Exception as e:
+            logger.debug(f"TurboJPEG encode: {e}, пробуем OpenCV")
+    if cv2 is None:
+        return None
+    # baseline без оптимизации Хаффмана — как у TurboJPEG по умолчанию
+    ok, buffer = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality,
+                                            cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+                                            cv2.IMWRITE_JPEG_PROGRESSIVE, 0])
+    # без tobytes(): плоский view держит массив imencode
+    return memoryview(buffer).cast("B") if ok else None
+
+
+def decode_jpeg(data) -> Optional[np.ndarray]:
+    """JPEG -> BGR-кадр или None при ошибке"""
+    if _TJ is not None:
+        try:
+            return _TJ.decode(data, pixel_format=TJPF_BGR)
+        except Exception as e:
+            logger.debug(f"TurboJPEG decode: {e}, пробуем OpenCV")
+    if cv2 is None:
+        return None
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def write_jpeg_jpegli(img: np.ndarray, path: str, quality: int = 80) -> bool:
+    """BGR-кадр -> JPEG-файл через cjpegli; False — jpegli нет или ошибка"""
+    if _CJPEGLI is None or np is None or img.ndim != 3 or img.shape[2] != 3:
+        return False
+    h, w = img.shape[:2]
+    try:
+        # cjpegli читает файлы: отдаём кадр как PPM (RGB)
+        with tempfile.NamedTemporaryFile(suffix=".ppm") as tmp:
+            tmp.write(b"P6\n%d %d\n255\n" % (w, h))
+            tmp.write(np.ascontiguousarray(img[..., ::-1]).data)
+            tmp.flush()
+            result = subprocess.run(
+                [_CJPEGLI, tmp.name, str(path), "-q", str(quality)],
+                capture_output=True, timeout=30)
+    except Exception as e:
+        logger.warning(f"cjpegli: {e}")
+        return False
+    if result.returncode != 0:
+        logger.warning(f"cjpegli завершился с кодом {result.returncode}: "
+                       f"{result.stderr.decode(errors='replace').strip()}")
+        return False
+    return True
@@ -226,7 +226,7 @@ Environment="PYTHONPATH=$PROJECT_DIR"
 ExecStart=$VENV_DIR/bin/gunicorn \
     --workers 1 \
     --worker-class gthread \
-    --threads 4 \
+    --threads 16 \
     --timeout 60 \
     --graceful-timeout 10 \
     --keep-alive 2 \
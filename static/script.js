@@ -634,10 +634,34 @@ function startTelemetrySSE_All() {
     };
 }
 
+// Если на сервере задан API_KEY — один раз входим по ключу: сервер выдаёт
+// cookie сессии, и fetch/EventSource/<img> дальше проходят проверку сами
+async function ensureSession() {
+    const resp = await fetch('/api/health');
+    if (resp.status !== 401) return;
+
+    const key = prompt('Ключ API робота');
+    if (!key) return;
+
+    const login = await fetch('/api/login', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ api_key: key })
+    });
+    if (login.ok) {
+        // остальные модули уже стартовали без cookie — перезагружаемся
+        location.reload();
+    } else {
+        showAlert('Неверный ключ API', 'danger');
+    }
+}
+
 // Инициализация при загрузке страницы
 document.addEventListener('DOMContentLoaded', function () {
     console.log('🤖 UI загружен');
 
+    ensureSession();
+
     // Переходим на SSE, без частого fetch('/api/status')
     startTelemetrySSE_All();
 
@@ -0,0 +1,127 @@
+"""USBCamera без железа: поддельные VideoCapture и VideoWriter"""
+
+import threading
+import time
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from robot.devices import camera as camera_mod  # noqa: E402
+
+WIDTH, HEIGHT, FPS = 64, 48, 30
+
+
+class FakeCapture:
+    """Отдаёт BGR-кадры с темпом FPS"""
+
+    def __init__(self, *args, **kwargs):
+        self.opened = True
+        self.props = {
+            cv2.CAP_PROP_FRAME_WIDTH: WIDTH,
+            cv2.CAP_PROP_FRAME_HEIGHT: HEIGHT,
+            cv2.CAP_PROP_FPS: FPS,
+        }
+
+    def isOpened(self):
+        return self.opened
+
+    def set(self, prop, value):
+        return True
+
+    def get(self, prop):
+        return self.props.get(prop, 0)
+
+    def grab(self):
+        time.sleep(1.0 / FPS)
+        return self.opened
+
+    def retrieve(self, image=None):
+        return True, np.full((HEIGHT, WIDTH, 3), 128, np.uint8)
+
+    def read(self, image=None):
+        self.grab()
+        return self.retrieve()
+
+    def release(self):
+        self.opened = False
+
+
+class FakeWriter:
+    def __init__(self):
+        self.frames = 0
+        self.released = False
+
+    def isOpened(self):
+        return True
+
+    def write(self, frame):
+        self.frames += 1
+
+    def release(self):
+        self.released = True
+
+
+@pytest.fixture
+def thread_errors(monkeypatch):
+    errors = []
+    monkeypatch.setattr(threading, "excepthook", errors.append)
+    return errors
+
+
+@pytest.fixture
+def camera(tmp_path, monkeypatch, thread_errors):
+    monkeypatch.setattr(camera_mod.cv2, "VideoCapture", FakeCapture)
+    cam = camera_mod.USBCamera(camera_mod.CameraConfig(
+        width=WIDTH, height=HEIGHT, fps=FPS, auto_start=False,
+        save_path=str(tmp_path / "photos"), video_path=str(tmp_path / "videos"),
+        stream_passthrough=False, stream_grayscale=False, pin_cores=False))
+    assert cam.start()
+    yield cam
+    cam.stop()
+
+
+def test_gray_callback_and_recording_cycle(camera, monkeypatch, thread_errors):
+    writer = FakeWriter()
+    monkeypatch.setattr(camera_mod, "_open_video_writer", lambda *a: writer)
+
+    frames = []
+    got_frame = threading.Event()
+
+    def on_gray(frame):
+        frames.append(frame)
+        got_frame.set()
+
+    camera.add_frame_callback(on_gray, expects="gray")
+    assert got_frame.wait(2.0)
+    assert frames[0].shape == (HEIGHT, WIDTH)
+
+    ok, _ = camera.start_recording("clip.mp4")
+    assert ok
+    record_thread = camera._record_thread
+    time.sleep(0.3)
+    ok, _ = camera.stop_recording()
+    assert ok
+
+    record_thread.join(1.0)
+    assert not record_thread.is_alive()
+    assert writer.released
+    assert writer.frames > 0
+    assert camera._capture_thread.is_alive()
+    assert not thread_errors
+
+
+def test_photo_and_frame_fresh_without_viewers(camera):
+    # стрим никто не смотрел — захват не делает retrieve(), кадр устаревает
+    time.sleep(0.5)
+    assert time.monotonic() - camera._current_frame_mono > 0.3
+
+    requested = time.monotonic()
+    ok, _ = camera.take_photo("idle.jpg", high_efficiency=False)
+    assert ok
+    assert camera._current_frame_mono >= requested
+
+    requested = time.monotonic()
+    assert camera.get_frame_jpeg() is not None
+    assert camera._stream_mono >= requested